@@ -0,0 +1,245 @@
+"""asyncio/httpx client engine for the LLM benchmark.
+
+Same options and the same outJson schema as locustfile.py, but every simulated user is a coroutine
+sharing one keep-alive connection pool, so a single process can keep thousands of SSE streams open
+instead of running 16 locust processes per server.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import time
+import logging
+
+import httpx
+import orjson
+
+from harness.sse import SSEStreamParser
+from harness.latency import TokenTimeline
+from harness.report import MetricsCollector, save_case_result, timeseries_path, meets_slo
+from harness.timeseries import TimeSeries
+
+try:
+    import uvloop  # Optional, a faster event loop
+except ImportError:
+    uvloop = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_timespan(time_str):
+    """'3m', '10s', '1h30m' or plain seconds, like locust's -t"""
+    if re.fullmatch(r"\d+(\.\d+)?", time_str):
+        return float(time_str)
+    match = re.fullmatch(r"((?P<h>\d+)h)?((?P<m>\d+)m)?((?P<s>\d+)s)?", time_str)
+    if not match or not time_str:
+        raise ValueError(f"Invalid time span {time_str}")
+    return int(match["h"] or 0) * 3600 + int(match["m"] or 0) * 60 + int(match["s"] or 0)
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.metrics = MetricsCollector()    # Plays the worker: what happened in the current interval
+        self.total = MetricsCollector()      # Plays the master: every interval merged
+        self.timeseries = TimeSeries(args.report_interval or 1)
+        self.warmup = parse_timespan(args.warmup)
+        self.n_failed = 0  # Errors and incomplete streams, warm-up included
+
+        with open(args.ifile, 'r') as file:
+            prompt = file.read()
+        ilen = os.path.splitext(os.path.basename(args.ifile))[0]
+        self.input_tokens = int(ilen) if ilen.isdigit() else 0
+        prompts = [prompt]
+        words = prompt.split()
+        for i in range(args.shuffle_prompts):  # Generate random prompt
+            random.shuffle(words)
+            prompts.append(' '.join(words))
+
+        common_config = {
+            "max_tokens": args.olen,
+            "stream": True,
+            "n": 1,
+            "temperature": 0,
+        }
+        if args.server == "Triton":
+            self.text_key = "Triton"
+            data = [common_config | {"text_input": p, "min_length": args.olen} for p in prompts]
+        elif args.endpoint.endswith("chat/completions"):
+            self.text_key = "chat"
+            data = [common_config | {"model": args.hf_model, "messages": [{"role": "user", "content": p}],
+                                     "ignore_eos": True, "stream_options": {"include_usage": True}}
+                    for p in prompts]
+        else:
+            self.text_key = "completions"
+            data = [common_config | {"model": args.hf_model, "prompt": p, "ignore_eos": True,
+                                     "stream_options": {"include_usage": True}}
+                    for p in prompts]
+        # Pre-serialized once, like the locustfile's body pool
+        self.body_pool = [orjson.dumps(d) for d in data]
+
+    async def user(self, client, user_id, t_end):
+        n_sent = n_completed = 0
+        backoff = 0
+        timeline = TokenTimeline(self.args.olen + 8)
+        while time.perf_counter() < t_end:
+            body = self.body_pool[n_sent % len(self.body_pool)]
+            measured = (time.perf_counter() >= self.t_warmup_end and n_sent >= self.args.warmup_requests)
+            n_sent += 1
+            if await self.send(client, body, timeline, measured):
+                n_completed += measured
+                backoff = 0
+            else:
+                # Don't hammer a failing or overloaded server: wait 0.1s, 0.2s, ... up to 5s before the next try
+                self.n_failed += 1
+                backoff = min(backoff * 2 or 0.1, 5)
+                await asyncio.sleep(min(backoff, max(t_end - time.perf_counter(), 0)))
+        self.metrics.add_user(n_completed, self.args.target)
+
+    async def send(self, client, body, timeline, measured):
+        metrics = self.metrics
+        metrics.count("Started")
+        metrics.in_flight += 1
+        t_start = time.perf_counter()
+        t_first_token = None
+        parser = SSEStreamParser(self.text_key)
+        timeline.reset()
+        try:
+            async with client.stream("POST", self.args.endpoint, content=body,
+                                     headers={"Content-Type": "application/json"}) as response:
+                if response.status_code != 200:
+                    logger.warning(f"Error in response: {(await response.aread())[:1000]}")
+                    return False
+                async for chunk in response.aiter_raw():
+                    now = time.perf_counter()
+                    if parser.feed(chunk):
+                        timeline.record(now)
+                        if t_first_token is None:
+                            t_first_token = now
+        except Exception as e:
+            logger.warning(f"Failed to parse response with error {repr(e)}")
+            return False
+        finally:
+            metrics.in_flight -= 1
+        if t_first_token is None:
+            return False
+
+        now = time.perf_counter()
+        e2e = now - t_start
+        ttft = t_first_token - t_start
+        tpot = (now - t_first_token) / (self.args.olen - 1) if self.args.olen > 1 else 0
+        usage = parser.usage or {}
+        output_tokens = usage.get("completion_tokens", parser.n_tokens)
+        metrics.record_series(ttft, e2e, output_tokens)
+        if not measured:
+            metrics.count("Warmup")
+            return True
+        metrics.count("Completed")
+        metrics.count("InputTokens", usage.get("prompt_tokens", self.input_tokens))
+        metrics.count("OutputTokens", output_tokens)
+        if meets_slo(ttft, tpot, self.args.slo_ttft_ms, self.args.slo_tpot_ms):
+            metrics.count("Good")
+        metrics.record("E2E", e2e)
+        metrics.record("TTFT", ttft)
+        metrics.record("TPOT", tpot)
+        for itl in timeline.itls():
+            metrics.record("ITL", itl)
+        return True
+
+    def collect(self, final):
+        msg = self.metrics.pop_message("async", final)
+        self.total.merge_message(msg)
+        self.timeseries.add(msg)
+
+    async def report_loop(self):
+        # Same fixed schedule as stream_metrics_to_master, so every interval gets exactly one delta
+        interval = self.args.report_interval
+        start = self.timeseries.t0
+        self.metrics.seq = 0
+        while True:
+            await asyncio.sleep(max(0, start + (self.metrics.seq + 1) * interval - time.time()))
+            self.collect(final=False)
+
+    async def run(self):
+        args = self.args
+        n_user = args.users
+        limits = httpx.Limits(max_connections=n_user, max_keepalive_connections=n_user)
+        timeout = httpx.Timeout(None, connect=60)
+        async with httpx.AsyncClient(base_url=args.host, limits=limits, timeout=timeout, http1=True) as client:
+            t_start = time.perf_counter()
+            self.t_warmup_end = t_start + self.warmup
+            t_end = t_start + parse_timespan(args.run_time)
+            self.timeseries.start(time.time())
+            reporter = asyncio.create_task(self.report_loop()) if args.report_interval > 0 else None
+            logger.info(f"Start {n_user} users for {args.run_time}")
+            users = [asyncio.create_task(self.user(client, i, t_end)) for i in range(n_user)]
+            # Like locust -t, in-flight requests are cancelled when the time is up
+            done, pending = await asyncio.wait(users, timeout=max(t_end - time.perf_counter(), 0) + 1)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if reporter is not None:
+                reporter.cancel()
+        for task in pending:  # Users cancelled mid-request didn't report themselves
+            self.metrics.add_user(0, args.target)
+        self.collect(final=True)
+        self.save()
+
+    def save(self):
+        args = self.args
+        self.timeseries.write_csv(timeseries_path(args.outJson, args.target), self.warmup)
+        duration = self.total.last_time - (self.timeseries.t0 + self.warmup)
+        result = self.total.summary(args.stall_factor, duration=duration,
+                                    slo_ttft_ms=args.slo_ttft_ms, slo_tpot_ms=args.slo_tpot_ms)
+        result["Warmup"] = {
+            "Duration(s)": self.warmup,
+            "Requests/user": args.warmup_requests,
+            "#Excluded": self.total.counters["Warmup"],
+        }
+        result["#Failed"] = self.n_failed
+        result["SteadyState"] = self.timeseries.steady_state(self.warmup)
+        save_case_result(args.outJson, args.server, args.target, result)
+        logger.info(f"#Req={result['#Req']}, #Failed={self.n_failed}, saved to {args.outJson}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio client engine. Options follow locustfile.py.")
+    parser.add_argument("--server", type=str, choices=['vLLM', 'Triton'], required=True,
+                        help="Choices=[vLLM, Triton]. Note: Triton is Triton-Inference-Server")
+    parser.add_argument("-H", "--host", type=str, required=True, help="e.g., http://localhost:8000")
+    parser.add_argument("-e", "--endpoint", type=str, required=True, help="The endpoint on server, e.g., /v1/completions")
+    parser.add_argument("-t", "--run-time", type=str, default="3m", help="e.g., 3m, 10s")
+    parser.add_argument("-u", "--users", type=int, required=True, help="Number of concurrent users")
+    parser.add_argument("-ifile", type=str, required=True, help="file of input txt")
+    parser.add_argument("-olen", type=int, required=True, help="number of output tokens")
+    parser.add_argument("-outJson", type=str, default="benchmark.json", help="file of output json to store metrics")
+    parser.add_argument("-target", type=str, help="saving result in the specified key 'target' in outJson file")
+    parser.add_argument("-m", "--hf-model", type=str, default=os.getenv("MODEL_PATH"),
+                        help="Path to HF model folder. If not specified we will use env var MODEL_PATH.")
+    parser.add_argument("--shuffle-prompts", type=int, default=0,
+                        help="Number of word-shuffled variants of the input prompt to rotate over")
+    parser.add_argument("--stall-factor", type=float, default=3.0,
+                        help="An ITL longer than stall-factor x the median ITL is counted as a decode stall")
+    parser.add_argument("--warmup", type=str, default="0", help="Drop requests sent during the first part, e.g. 30s")
+    parser.add_argument("--warmup-requests", type=int, default=0, help="Drop the first n requests of every user")
+    parser.add_argument("--slo-ttft-ms", type=float, help="TTFT limit of the goodput SLO")
+    parser.add_argument("--slo-tpot-ms", type=float, help="TPOT limit of the goodput SLO")
+    parser.add_argument("--report-interval", type=float, default=5, help="Interval (s) of the time series")
+    args = parser.parse_args()
+
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(Benchmark(args).run())
+
+
+if __name__ == "__main__":
+    main()
+
+'''
+python async_bench.py --server vLLM --hf-model $MODEL_PATH \
+    --host http://localhost:8000 --endpoint /v1/completions \
+    -t 3m -u 1024 -ifile Datasets/2000.txt -olen 150 \
+    -outJson report/server0.json -target Llama-3.1-8B/3m_i2000_1024user
+'''
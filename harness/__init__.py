@@ -0,0 +1 @@
+# Shared helpers for the locust clients and the result scripts.
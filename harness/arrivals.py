@@ -0,0 +1,37 @@
+"""Request arrival processes for the open-loop load mode."""
+import random
+
+
+def poisson_arrivals(rate, t0, seed=None):
+    """Arrival times (same clock as t0) of a Poisson process with `rate` requests/s."""
+    rng = random.Random(seed)
+    t = t0
+    while True:
+        t += rng.expovariate(rate)
+        yield t
+
+
+def load_trace(path):
+    """Arrival offsets (s) from a trace file, relative to its first arrival.
+
+    One arrival per line. Only the first comma/whitespace separated column is used, so a
+    timestamp,ilen,olen CSV works too. Lines that don't start with a number (headers) are skipped.
+    """
+    offsets = []
+    with open(path, 'r') as f:
+        for line in f:
+            field = line.replace(',', ' ').split()
+            if not field:
+                continue
+            try:
+                offsets.append(float(field[0]))
+            except ValueError:
+                continue
+    offsets.sort()
+    return [t - offsets[0] for t in offsets] if offsets else []
+
+
+def trace_arrivals(offsets, t0, slot, n_slot):
+    """Replay every n_slot-th arrival of the trace starting at `slot`, so n_slot users share one trace."""
+    for offset in offsets[slot::n_slot]:
+        yield t0 + offset
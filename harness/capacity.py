@@ -0,0 +1,84 @@
+"""Capacity of a serving layout from its #User sweep.
+
+The points of a sweep are (users per server, throughput, latencies) of the whole fleet. Two things
+are read off the curve:
+
+* The SLO capacity: the highest concurrency whose TTFT/TPOT still meet the SLO, linearly
+  interpolated between the last passing and the first failing point, and the throughput there.
+* The saturation point: the throughput is fitted with the Universal Scalability Law
+  X(N) = lambda * N / (1 + sigma * (N - 1) + kappa * N * (N - 1)), which peaks at
+  N* = sqrt((1 - sigma) / kappa). sigma is the contention and kappa the coherency cost; with
+  lambda = X(1) the fit is a linear least squares in (sigma, kappa).
+"""
+import math
+import re
+
+LAYOUT = re.compile(r"_?(\d+)xTP(\d+)")
+
+
+def parse_layout(name):
+    """NoPrefix_meta-llama_Llama-3.1-8B_4xTP2 -> ("NoPrefix_meta-llama_Llama-3.1-8B", 4, 2). (name, 1, None) without a layout."""
+    match = LAYOUT.search(name)
+    if not match:
+        return name, 1, None
+    return name[:match.start()] + name[match.end():], int(match.group(1)), int(match.group(2))
+
+
+def fit_usl(points):
+    """(lambda, sigma, kappa) of [(n, throughput)], or None without a 1 user point and two more."""
+    base = [x for n, x in points if n == 1 and x > 0]
+    rest = [(n, x) for n, x in points if n > 1 and x > 0]
+    if not base or len(rest) < 2:
+        return None
+    lam = base[0]
+    # n * lambda / X(n) - 1 = sigma * (n - 1) + kappa * n * (n - 1)
+    sxx = sxy = syy = sxz = syz = 0.0
+    for n, x in rest:
+        a, b, z = n - 1, n * (n - 1), n * lam / x - 1
+        sxx, sxy, syy, sxz, syz = sxx + a * a, sxy + a * b, syy + b * b, sxz + a * z, syz + b * z
+    det = sxx * syy - sxy * sxy
+    if det == 0:
+        return None
+    sigma = (sxz * syy - syz * sxy) / det
+    kappa = (syz * sxx - sxz * sxy) / det
+    return lam, sigma, kappa
+
+
+def usl_peak(sigma, kappa):
+    """Concurrency of the highest throughput, inf if it never bends down."""
+    if kappa <= 0:
+        return math.inf
+    return math.sqrt(max(1 - sigma, 0) / kappa)
+
+
+def slo_capacity(points, limits):
+    """Highest concurrency and its throughput under the SLO.
+
+    points: [{"users": .., "throughput": .., <metric>: ..}] of one curve
+    limits: {metric: limit}, e.g. {"TTFT": 1.0, "TPOT": 0.05}
+    Return (users, throughput), (0, 0) if even the lowest concurrency misses the SLO.
+    """
+    points = sorted(points, key=lambda point: point["users"])
+    def passes(point):
+        return all(point.get(metric) is not None and point[metric] <= limit for metric, limit in limits.items())
+    last = None
+    for point in points:
+        if not passes(point):
+            break
+        last = point
+    else:
+        return (last["users"], last["throughput"]) if last else (0, 0)
+    if last is None:
+        return 0, 0
+    # Where the first violated latency crosses its limit between `last` and `point`. A latency the failing
+    # point doesn't have can't be interpolated, so the capacity stays at the last passing point
+    fraction = 1.0
+    for metric, limit in limits.items():
+        low, high = last[metric], point.get(metric)
+        if high is None:
+            fraction = 0.0
+        elif high > limit and high > low:
+            fraction = min(fraction, (limit - low) / (high - low))
+    users = last["users"] + fraction * (point["users"] - last["users"])
+    throughput = last["throughput"] + fraction * (point["throughput"] - last["throughput"])
+    return users, throughput
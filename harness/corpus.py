@@ -0,0 +1,100 @@
+"""Memory-mapped prompt corpus, built once offline and shared by every locust process.
+
+Layout (little endian):
+    magic "LLMCORP1" | uint64 n_prompt | uint64 meta_len | meta (JSON)
+    | uint64 offsets[n_prompt + 1] | uint32 token_lens[n_prompt] | UTF-8 blob
+Prompt i is blob[offsets[i]:offsets[i + 1]]. The offsets and lengths are read in place from the
+mapping, so opening a corpus costs the same for 200 or 200k prompts and all users of a process share
+the pages the OS already has cached.
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from functools import lru_cache
+
+assert sys.byteorder == "little" and array("Q").itemsize == 8 and array("I").itemsize == 4
+MAGIC = b"LLMCORP1"
+HEADER = struct.Struct("<8sQQ")
+
+
+def write_corpus(path, prompts, token_lens, meta=None):
+    """prompts: list of str. token_lens: token count of every prompt under the model's tokenizer."""
+    write_corpus_chunks(path, [(prompts, token_lens)], meta)
+
+
+def write_corpus_chunks(path, chunks, meta=None):
+    """chunks: iterable of (prompts, token_lens). Only one chunk is held at a time, the blob goes to a
+    spill file until all offsets are known."""
+    offsets = array("Q", [0])
+    lens = array("I")
+    meta = json.dumps(meta or {}).encode("utf-8")
+
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp + ".blob", "w+b") as blob:
+            for prompts, token_lens in chunks:
+                assert len(prompts) == len(token_lens)
+                for prompt in prompts:
+                    b = prompt.encode("utf-8")
+                    offsets.append(offsets[-1] + len(b))
+                    blob.write(b)
+                lens.extend(int(n) for n in token_lens)
+            blob.seek(0)
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(lens), len(meta)))
+                f.write(meta)
+                f.write(offsets.tobytes())
+                f.write(lens.tobytes())
+                shutil.copyfileobj(blob, f)
+    finally:
+        os.remove(tmp + ".blob")
+    os.replace(tmp, path)  # Workers never map a half-written corpus
+
+
+class PromptCorpus:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_prompt, meta_len = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a prompt corpus")
+        pos = HEADER.size
+        self.meta = json.loads(self.mm[pos:pos + meta_len])
+        pos += meta_len
+        view = memoryview(self.mm)
+        self.offsets = view[pos:pos + 8 * (n_prompt + 1)].cast("Q")
+        pos += self.offsets.nbytes
+        self.token_lens = view[pos:pos + 4 * n_prompt].cast("I")
+        pos += self.token_lens.nbytes
+        self.blob_start = pos
+
+    def __len__(self):
+        return len(self.token_lens)
+
+    def raw(self, i):
+        """UTF-8 bytes of prompt i, a view into the mapping."""
+        start = self.blob_start + self.offsets[i]
+        end = self.blob_start + self.offsets[i + 1]
+        return memoryview(self.mm)[start:end]
+
+    def __getitem__(self, i):
+        return str(self.raw(i), "utf-8")
+
+    def user_indices(self, seed, n):
+        """n prompt indices of the user with this seed. Users start at different spots of the corpus."""
+        start = seed % len(self)
+        return [(start + k) % len(self) for k in range(n)]
+
+
+@lru_cache(maxsize=None)
+def open_corpus(path):
+    """One mapping per process, shared by all its users."""
+    return PromptCorpus(path)
@@ -0,0 +1,120 @@
+"""Mergeable log-bucketed latency histogram (HDR-style).
+
+Bucket i > 0 covers (min_value * (1+precision)^(i-1), min_value * (1+precision)^i], so any
+percentile is known within `precision` relative error. Buckets are kept sparse, which keeps a
+histogram at O(buckets) memory however many requests are recorded, and two histograms with the
+same layout merge by adding counts. count/sum/sumsq/min/max are exact.
+"""
+import math
+
+DEFAULT_PRECISION = 0.01  # 1% relative error
+DEFAULT_MIN_VALUE = 1e-6  # 1 us, latencies are recorded in seconds
+
+
+class LogHistogram:
+    def __init__(self, precision=DEFAULT_PRECISION, min_value=DEFAULT_MIN_VALUE):
+        self.precision = precision
+        self.min_value = min_value
+        self._log_growth = math.log1p(precision)
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def bucket_index(self, value):
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_growth) + 1
+
+    def bucket_upper(self, index):
+        return self.min_value * (1 + self.precision) ** index
+
+    def record(self, value, n=1):
+        index = self.bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += n
+        self.sum += value * n
+        self.sumsq += value * value * n
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        assert (self.precision, self.min_value) == (other.precision, other.min_value), \
+            "Only histograms with the same bucket layout can be merged"
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0
+
+    @property
+    def stddev(self):
+        if self.count < 2:
+            return 0
+        variance = (self.sumsq - self.sum * self.sum / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0))
+
+    def percentile(self, q):
+        """q-th percentile (0-100). The geometric middle of the bucket holding that rank, clamped to [min, max]."""
+        if self.count == 0:
+            return 0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                break
+        if index == 0:
+            value = self.min_value
+        else:
+            value = self.bucket_upper(index) / math.sqrt(1 + self.precision)
+        return min(max(value, self.min), self.max)
+
+    def count_above(self, threshold):
+        """Number of recorded values above `threshold`, exact up to the bucket holding the threshold."""
+        first = self.bucket_index(threshold) + 1
+        return sum(n for index, n in self.buckets.items() if index >= first)
+
+    def to_dict(self):
+        """Plain lists/numbers, so the histogram can go through locust's send_message and json.dump."""
+        indexes = sorted(self.buckets)
+        return {
+            "precision": self.precision,
+            "min_value": self.min_value,
+            "count": self.count,
+            "sum": self.sum,
+            "sumsq": self.sumsq,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "index": indexes,
+            "counts": [self.buckets[i] for i in indexes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data["precision"], data["min_value"])
+        hist.buckets = dict(zip(data["index"], data["counts"]))
+        hist.count = data["count"]
+        hist.sum = data["sum"]
+        hist.sumsq = data["sumsq"]
+        if hist.count:
+            hist.min = data["min"]
+            hist.max = data["max"]
+        return hist
+
+
+def latency_summary(name, hist, percentiles=(50, 90, 99, 99.9)):
+    """Request-weighted mean and percentiles, e.g. {"TTFT": .., "TTFT_P50": .., ..., "TTFT_P99.9": ..}"""
+    summary = {name: hist.mean}
+    for q in percentiles:
+        summary[f"{name}_P{q:g}"] = hist.percentile(q)
+    return summary
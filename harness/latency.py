@@ -0,0 +1,30 @@
+"""Per-token latency capture for the streaming clients."""
+from array import array
+
+
+class TokenTimeline:
+    """Preallocated buffer holding the arrival time of every streamed chunk of one request.
+
+    One instance lives as long as the user and is reset per request, so recording a token is a
+    store into a flat C double array instead of growing a Python list.
+    """
+
+    def __init__(self, capacity):
+        self.ts = array('d', bytes(8 * max(capacity, 2)))
+        self.n = 0
+
+    def reset(self):
+        self.n = 0
+
+    def record(self, t):
+        if self.n == len(self.ts):
+            self.ts.extend(self.ts)  # Double the capacity when the server streams more chunks than expected
+        self.ts[self.n] = t
+        self.n += 1
+
+    def itls(self):
+        """Inter-token latencies of the recorded request."""
+        ts = self.ts
+        for i in range(1, self.n):
+            yield ts[i] - ts[i-1]
+
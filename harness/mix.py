@@ -0,0 +1,92 @@
+"""Weighted input/output length mixes, so one locust run sends a population of prompt lengths."""
+import bisect
+import csv
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+# Column names of the (input, output) lengths in a length trace: our own CSV, BurstGPT
+INPUT_COLUMNS = ("input_len", "request tokens")
+OUTPUT_COLUMNS = ("output_len", "response tokens")
+WEIGHT_COLUMNS = ("weight", "count")
+
+
+class LengthClass(namedtuple("LengthClass", ["ilen", "olen", "weight"])):
+    @property
+    def name(self):
+        return f"i{self.ilen}_o{self.olen}"
+
+
+def parse_weighted(spec):
+    """'2000:5,4400:3,8600' -> [(2000, 5.0), (4400, 3.0), (8600, 1.0)]"""
+    values = []
+    for item in spec.split(','):
+        value, _, weight = item.strip().partition(':')
+        values.append((int(value), float(weight) if weight else 1.0))
+    return values
+
+
+def cross_mix(ilen_spec, olen_spec):
+    """Independent input and output length distributions -> every (ilen, olen) class."""
+    return [LengthClass(ilen, olen, wi * wo)
+            for ilen, wi in parse_weighted(ilen_spec) for olen, wo in parse_weighted(olen_spec)]
+
+
+def nearest(values, x):
+    return min(values, key=lambda v: abs(v - x))
+
+
+@lru_cache(maxsize=None)
+def histogram_mix(path, ilens, olens):
+    """Replay the length histogram of a trace (CSV with a header, e.g. BurstGPT), snapped to the
+    ilens x olens grid (tuples). Every row counts once, or by its weight/count column. The trace is
+    read once per process; all users get the same tuple of classes."""
+    counts = {}
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames}
+
+        def column(candidates, required=True):
+            for candidate in candidates:
+                if candidate in columns:
+                    return columns[candidate]
+            if required:
+                raise ValueError(f"{path} has none of the columns {candidates}")
+            return None
+        i_col, o_col = column(INPUT_COLUMNS), column(OUTPUT_COLUMNS)
+        w_col = column(WEIGHT_COLUMNS, required=False)
+        for row in reader:
+            olen = float(row[o_col])
+            if olen <= 0:  # Failed requests in BurstGPT
+                continue
+            key = (nearest(ilens, float(row[i_col])), nearest(olens, olen))
+            counts[key] = counts.get(key, 0) + (float(row[w_col]) if w_col else 1)
+    return tuple(LengthClass(ilen, olen, weight) for (ilen, olen), weight in sorted(counts.items()))
+
+
+def mix_from_options(options):
+    """The length classes of --mix-ilen/--mix-olen or --mix-hist, None without a mix."""
+    if options.mix_hist:
+        if not options.mix_ilen:
+            raise ValueError("--mix-hist needs the --mix-ilen lengths to snap the trace to")
+        ilens = tuple(v for v, _ in parse_weighted(options.mix_ilen))
+        olens = tuple(v for v, _ in parse_weighted(options.mix_olen)) if options.mix_olen else (options.olen,)
+        return histogram_mix(options.mix_hist, ilens, olens)
+    if options.mix_ilen:
+        return cross_mix(options.mix_ilen, options.mix_olen or str(options.olen))
+    return None
+
+
+class MixSampler:
+    def __init__(self, classes, seed=None):
+        self.rng = random.Random(seed)
+        self.cum_weights = []
+        total = 0
+        for c in classes:
+            total += c.weight
+            self.cum_weights.append(total)
+
+    def sample(self):
+        """Index of the class of the next request."""
+        x = self.rng.random() * self.cum_weights[-1]
+        return bisect.bisect_right(self.cum_weights, x)
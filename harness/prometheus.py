@@ -0,0 +1,276 @@
+"""Prometheus /metrics parsing: snapshots of the servers, their difference over a test case, and a table
+indexed over many /metrics dumps."""
+import math
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Sample suffixes of the series that only grow (histogram/summary parts)
+CUMULATIVE_SUFFIXES = ("_total", "_count", "_sum", "_bucket", "_created")
+
+
+def iter_samples(lines, types):
+    """One pass over the text exposition format. Yield (name, labels, value) of every sample, where labels is
+    the raw '{...}' string ('' without labels), and fill `types` with the # TYPE of every family."""
+    for line in lines:
+        if not line or line[0] == '#':
+            if line.startswith("# TYPE "):
+                _, _, family, kind = line.split(None, 3)
+                types[family] = kind.strip()
+            continue
+        brace = line.find('{')
+        if brace != -1:
+            close = line.rfind('}')  # Label values may contain '}', the value and timestamp can't
+            name, labels, rest = line[:brace], line[brace:close + 1], line[close + 1:]
+        else:
+            name, _, rest = line.partition(' ')
+            labels = ""
+        yield name, labels, float(rest.split(None, 1)[0])  # value [timestamp]
+
+
+def parse_exposition(text):
+    """Text exposition format -> ({family: type}, {(name, labels): value})."""
+    types = {}
+    samples = {(name, labels): value for name, labels, value in iter_samples(text.splitlines(), types)}
+    return types, samples
+
+
+def parse_file(path):
+    """A /metrics dump -> ({family: type}, {name: {labels: value}}), streamed line by line."""
+    types = {}
+    samples = {}
+    with open(path, 'r') as f:
+        for name, labels, value in iter_samples((line.rstrip('\n') for line in f), types):
+            samples.setdefault(name, {})[labels] = value
+    return types, samples
+
+
+def sample_type(name, types):
+    """Type of the family a sample belongs to, e.g. vllm:e2e_request_latency_seconds_bucket -> histogram."""
+    if name in types:
+        return types[name]
+    for suffix in CUMULATIVE_SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in types:
+            return types[name[:-len(suffix)]]
+    return "untyped"
+
+
+def is_cumulative(name, types):
+    kind = sample_type(name, types)
+    if kind in ("counter", "histogram", "summary"):
+        return not name.endswith("_created") and not (kind == "summary" and "quantile=" in name)
+    return kind == "untyped" and name.endswith(CUMULATIVE_SUFFIXES[:4])
+
+
+def delta_samples(before, after, types):
+    """after - before of the counters and histograms, gauges as in `after`. A counter that went down
+    (server restarted in between) counts from 0."""
+    delta = {}
+    for key, value in after.items():
+        if is_cumulative(key[0], types):
+            prev = before.get(key, 0.0)
+            delta[key] = value - prev if value >= prev else value
+        else:
+            delta[key] = value
+    return delta
+
+
+def format_exposition(types, samples):
+    lines = [f"# TYPE {family} {kind}" for family, kind in types.items()]
+    for (name, labels), value in samples.items():
+        if math.isfinite(value) and value == int(value):
+            value = int(value)
+        lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def delta_exposition(before_text, after_text):
+    """/metrics text of what happened between two scrapes, in the same format as a scrape of a fresh server."""
+    _, before = parse_exposition(before_text)
+    types, after = parse_exposition(after_text)
+    return format_exposition(types, delta_samples(before, after, types))
+
+
+def parse_labels(labels):
+    """'{le="0.5",model_name="m"}' -> {"le": "0.5", "model_name": "m"}. A new dict every call, callers may modify it."""
+    return dict(_label_items(labels))
+
+
+@lru_cache(maxsize=65536)
+def _label_items(labels):
+    """Cached parse of a label string. A tuple of (key, value), so no caller can change the cached value."""
+    result = []
+    i, n = 1, len(labels) - 1
+    while i < n:
+        eq = labels.index('=', i)
+        key = labels[i:eq].strip().lstrip(',').strip()
+        j = eq + 2  # Skip ="
+        value = []
+        while labels[j] != '"':
+            if labels[j] == '\\':
+                j += 1
+            value.append(labels[j])
+            j += 1
+        result.append((key, ''.join(value)))
+        i = j + 1
+    return tuple(result)
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+def histogram_percentile(buckets, q):
+    """Like PromQL histogram_quantile: buckets is [(upper bound, cumulative count)], q in [0, 100]."""
+    buckets = sorted(buckets)
+    total = buckets[-1][1] if buckets else 0
+    if total <= 0:
+        return None
+    rank = q / 100 * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return prev_bound  # Beyond the largest finite bucket
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+class MetricSeries:
+    """/metrics scrapes of one server over a test case, stored column-wise: one array per sample key.
+
+    A key that shows up in a later scrape is NaN in the earlier ones. `to_dict()` is the compact
+    columnar file format: {"Times": [...], "Types": {...}, "Keys": [[name, labels], ...], "Values": [[...], ...]}
+    """
+
+    def __init__(self):
+        self.times = []
+        self.types = {}
+        self.index = {}   # (name, labels) -> column
+        self.columns = []
+
+    def add(self, t, text):
+        types, samples = parse_exposition(text)
+        self.types.update(types)
+        n = len(self.times)
+        for key, value in samples.items():
+            col = self.index.get(key)
+            if col is None:
+                col = self.index[key] = len(self.columns)
+                self.columns.append(array('d', [math.nan] * n))
+            self.columns[col].append(value)
+        for column in self.columns:
+            if len(column) == n:  # Key missing from this scrape
+                column.append(math.nan)
+        self.times.append(t)
+
+    def snapshot(self, i):
+        return {key: self.columns[col][i] for key, col in self.index.items() if not math.isnan(self.columns[col][i])}
+
+    def delta(self, first=0, last=-1):
+        """Counters and histograms between two scrapes, gauges at the last one."""
+        return delta_samples(self.snapshot(first), self.snapshot(last), self.types)
+
+    def rates(self, name, labels=""):
+        """Per-interval rate (1/s) of a counter: [(interval end time, rate)]."""
+        column = self.columns[self.index[(name, labels)]]
+        return [(self.times[i], (column[i] - column[i - 1]) / (self.times[i] - self.times[i - 1]))
+                for i in range(1, len(self.times)) if self.times[i] > self.times[i - 1]]
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Per-case deltas of the counters, and count/mean/percentiles of every histogram from its bucket deltas."""
+        delta = self.delta()
+        duration = self.times[-1] - self.times[0] if len(self.times) > 1 else 0
+        counters, histograms = {}, {}
+        for (name, labels), value in delta.items():
+            kind = sample_type(name, self.types)
+            if kind == "counter" and is_cumulative(name, self.types):
+                counters[name + labels] = value
+            elif kind == "histogram" and name.endswith("_bucket"):
+                label_map = parse_labels(labels)
+                bound = float(label_map.pop("le"))
+                family = name[:-len("_bucket")] + format_labels(label_map)
+                histograms.setdefault(family, []).append((bound, value))
+        result = {"Duration(s)": duration, "Counters": counters, "Histograms": {}}
+        for family, buckets in histograms.items():
+            name, _, labels = family.partition("{")
+            labels = "{" + labels if labels else ""
+            count = delta.get((name + "_count", labels), 0)
+            hist = {"Count": count, "Mean": delta.get((name + "_sum", labels), 0) / count if count else None}
+            for q in percentiles:
+                hist[f"P{q:g}"] = histogram_percentile(buckets, q)
+            result["Histograms"][family] = hist
+        return result
+
+    def to_dict(self):
+        keys = list(self.index)
+        return {
+            "Times": self.times,
+            "Types": self.types,
+            "Keys": [list(key) for key in keys],
+            "Values": [[None if math.isnan(v) else v for v in self.columns[self.index[key]]] for key in keys],
+        }
+
+
+class MetricTable:
+    """/metrics dumps of many files, indexed by file, then sample name, then labels.
+
+    table = MetricTable.load(paths)
+    table.value(path, "vllm:request_success_total", finished_reason="length")
+    table.percentile([path0, path1], "vllm:time_to_first_token_seconds", 99)
+    """
+
+    def __init__(self):
+        self.types = {}
+        self.files = {}  # path -> name -> labels -> value
+
+    @classmethod
+    def load(cls, paths, workers=None):
+        """Parse the files in parallel over `workers` processes (default: one per CPU, 1: in this process)."""
+        table = cls()
+        paths = list(paths)
+        workers = workers or min(len(paths), os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                results = executor.map(parse_file, paths, chunksize=max(1, len(paths) // (4 * workers)))
+                for path, result in zip(paths, results):
+                    table.add(path, *result)
+        else:
+            for path in paths:
+                table.add(path, *parse_file(path))
+        return table
+
+    def add(self, path, types, samples):
+        self.types.update(types)
+        self.files[path] = samples
+
+    def select(self, path, name, **match):
+        """(labels dict, value) of the samples of `name` in `path` whose labels include `match`."""
+        for labels, value in self.files.get(path, {}).get(name, {}).items():
+            label_map = parse_labels(labels) if labels else {}
+            if all(label_map.get(k) == v for k, v in match.items()):
+                yield label_map, value
+
+    def value(self, paths, name, **match):
+        """Sum of the matching samples over one or several files."""
+        if isinstance(paths, str):
+            paths = [paths]
+        return sum(value for path in paths for _, value in self.select(path, name, **match))
+
+    def buckets(self, paths, family, **match):
+        """[(upper bound, cumulative count)] of a histogram, summed over files and other labels."""
+        if isinstance(paths, str):
+            paths = [paths]
+        counts = {}
+        for path in paths:
+            for label_map, value in self.select(path, family + "_bucket", **match):
+                bound = float(label_map["le"])
+                counts[bound] = counts.get(bound, 0) + value
+        return sorted(counts.items())
+
+    def percentile(self, paths, family, q, **match):
+        return histogram_percentile(self.buckets(paths, family, **match), q)
@@ -0,0 +1,54 @@
+"""Comparison of two result sets of the same test cases.
+
+A metric regresses when it moves the wrong way by more than a threshold (%) and, when the
+requests behind both values are known, the difference is significant. Locust results keep
+count/sum/sumsq of every latency in their histograms, which is all a Welch t-test needs; with
+hundreds of requests per case the t distribution is close enough to normal to use erfc.
+"""
+import math
+
+# Metrics where more is better. Everything else (latencies) is better lower
+HIGHER_IS_BETTER = ("#Req", "Req/s", "Tok/s", "Goodput", "throughput", "Successful requests")
+
+
+def higher_is_better(metric):
+    return any(key in metric for key in HIGHER_IS_BETTER)
+
+
+def sample_stats(result, metric):
+    """(n, mean, variance) of the requests behind a latency metric, or None without a histogram."""
+    hist = result.get("Hist", {}).get(metric)
+    if not hist or hist["count"] < 2:
+        return None
+    n = hist["count"]
+    mean = hist["sum"] / n
+    variance = max((hist["sumsq"] - hist["sum"] * mean) / (n - 1), 0)
+    return n, mean, variance
+
+
+def welch_p_value(a, b):
+    """Two-sided p-value of equal means for two (n, mean, variance)."""
+    (n1, mean1, var1), (n2, mean2, var2) = a, b
+    se = math.sqrt(var1 / n1 + var2 / n2)
+    if se == 0:
+        return 1.0 if mean1 == mean2 else 0.0
+    return math.erfc(abs(mean1 - mean2) / se / math.sqrt(2))
+
+
+def compare_case(base, other, metrics, threshold, alpha):
+    """Rows {"Metric", "Base", "New", "Delta(%)", "p", "Status"} of one test case. Status is
+    "regression", "improvement" or "" (within the threshold or not significant)."""
+    rows = []
+    for metric in metrics:
+        if metric not in base or metric not in other:
+            continue
+        old, new = base[metric], other[metric]
+        delta = (new - old) / old * 100 if old else math.inf if new else 0.0
+        stats = sample_stats(base, metric), sample_stats(other, metric)
+        p = welch_p_value(*stats) if all(stats) else None
+        worse = delta < 0 if higher_is_better(metric) else delta > 0
+        status = ""
+        if abs(delta) > threshold and (p is None or p < alpha):
+            status = "regression" if worse else "improvement"
+        rows.append({"Metric": metric, "Base": old, "New": new, "Delta(%)": delta, "p": p, "Status": status})
+    return rows
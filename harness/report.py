@@ -0,0 +1,231 @@
+"""Worker -> master aggregation of the locust metrics and the results writer."""
+import math
+import os
+import re
+import time
+from datetime import datetime
+
+import pytz
+
+from harness.histogram import LogHistogram, latency_summary
+from harness.results_store import append_result, results_path
+
+LATENCY_METRICS = ["E2E", "TTFT", "TPOT", "ITL", "Queue"]  # Queue: client-side wait of open-loop arrivals
+COUNTERS = ["Started", "Completed", "InputTokens", "OutputTokens", "Good", "Warmup"]
+SERIES_METRICS = ["TTFT", "E2E"]
+SERIES_COUNTERS = ["Completed", "OutputTokens"]
+
+
+class MetricsCollector:
+    """Latency histograms of one locust process.
+
+    Users of a worker record every request into the worker's collector. The worker periodically
+    sends what was recorded since the last message with `pop_message()` and the master merges all
+    workers with `merge_message()`, so the master sees the latency distribution of every request,
+    not per-user averages, and keeps the data of a worker that dies before the end of the test.
+
+    Only measured requests go into `hists`/`counters`. Every request, warm-up included, also goes
+    into the smaller `series` used for the master's time series. `groups` holds extra histograms
+    per request class, e.g. the turn of a conversation.
+    """
+
+    def __init__(self):
+        self.hists = {metric: LogHistogram() for metric in LATENCY_METRICS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.series = {metric: LogHistogram() for metric in SERIES_METRICS}
+        self.series_counters = dict.fromkeys(SERIES_COUNTERS, 0)
+        self.groups = {}  # group -> metric -> LogHistogram
+        self.in_flight = 0  # Gauge, only meaningful on a worker
+        self.n_req_per_user = []
+        self.target = None
+        self.last_time = None  # Send time of the latest merged message
+        self.seq = None  # Index of the next streamed interval of a worker, None without streaming
+
+    def record(self, metric, value):
+        self.hists[metric].record(value)
+
+    def record_group(self, group, metric, value):
+        hists = self.groups.setdefault(group, {})
+        if metric not in hists:
+            hists[metric] = LogHistogram()
+        hists[metric].record(value)
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def record_series(self, ttft, e2e, output_tokens):
+        self.series["TTFT"].record(ttft)
+        self.series["E2E"].record(e2e)
+        self.series_counters["Completed"] += 1
+        self.series_counters["OutputTokens"] += output_tokens
+
+    def add_user(self, n_completed_request, target):
+        self.n_req_per_user.append(n_completed_request)
+        self.target = target
+
+    def to_message(self):
+        return {
+            "#Req": self.n_req_per_user,
+            "Hist": {metric: hist.to_dict() for metric, hist in self.hists.items()},
+            "Counters": dict(self.counters),
+            "Series": {
+                "Hist": {metric: hist.to_dict() for metric, hist in self.series.items()},
+                "Counters": dict(self.series_counters),
+            },
+            "Groups": {group: {metric: hist.to_dict() for metric, hist in hists.items()}
+                       for group, hists in self.groups.items()},
+            "InFlight": self.in_flight,
+            "Target": self.target,
+        }
+
+    def pop_message(self, worker, final):
+        """The metrics recorded since the previous call, then start a new interval."""
+        msg = self.to_message()
+        msg["Worker"] = worker
+        msg["Time"] = time.time()
+        msg["Final"] = final
+        if self.seq is not None:
+            msg["Seq"] = self.seq
+            self.seq += 1
+        self.hists = {metric: LogHistogram() for metric in LATENCY_METRICS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.series = {metric: LogHistogram() for metric in SERIES_METRICS}
+        self.series_counters = dict.fromkeys(SERIES_COUNTERS, 0)
+        self.groups = {}
+        self.n_req_per_user = []
+        return msg
+
+    def merge_message(self, data):
+        self.n_req_per_user += data["#Req"]
+        for metric, hist in data["Hist"].items():
+            self.hists[metric].merge(LogHistogram.from_dict(hist))
+        for counter, n in data["Counters"].items():
+            self.counters[counter] += n
+        for group, hists in data.get("Groups", {}).items():
+            for metric, hist in hists.items():
+                mine = self.groups.setdefault(group, {})
+                if metric not in mine:
+                    mine[metric] = LogHistogram()
+                mine[metric].merge(LogHistogram.from_dict(hist))
+        if data["Target"] is not None:
+            self.target = data["Target"]
+        if "Time" in data:
+            self.last_time = max(self.last_time or 0, data["Time"])
+
+    @property
+    def n_user(self):
+        return len(self.n_req_per_user)
+
+    def summary(self, stall_factor=3.0, duration=None, slo_ttft_ms=None, slo_tpot_ms=None):
+        """
+        duration: length (s) of the measured window, for the throughput and goodput rates
+        slo_ttft_ms, slo_tpot_ms: the limits the workers counted "Good" requests against
+        """
+        completed = self.counters["Completed"]
+        result = {"#Req": completed}
+        for metric, hist in self.hists.items():
+            if hist.count:
+                result.update(latency_summary(metric, hist))
+        itl = self.hists["ITL"]
+        if itl.count:
+            # A decode stall is an inter-token gap much longer than the typical one
+            result["ITL_Max"] = itl.max
+            result["#Stall"] = itl.count_above(itl.percentile(50) * stall_factor)
+        if duration:
+            result["Duration(s)"] = duration
+            result["Req/s"] = completed / duration
+            result["InputTok/s"] = self.counters["InputTokens"] / duration
+            result["OutputTok/s"] = self.counters["OutputTokens"] / duration
+            result["Goodput(req/s)"] = self.counters["Good"] / duration
+        result["Goodput(%)"] = self.counters["Good"] / completed * 100 if completed else 0
+        result["SLO"] = {"TTFT(ms)": slo_ttft_ms, "TPOT(ms)": slo_tpot_ms}
+        if self.groups:
+            result["Groups"] = self.group_summary()
+        result["Hist"] = {metric: hist.to_dict() for metric, hist in self.hists.items() if hist.count}
+        return result
+
+    def group_summary(self):
+        """{group: {"#Req": .., "TTFT": .., "TTFT_P50": .., ...}}, groups in natural order (Turn2 < Turn10)."""
+        def natural_key(group):
+            return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", group)]
+        summary = {}
+        for group in sorted(self.groups, key=natural_key):
+            hists = self.groups[group]
+            summary[group] = {"#Req": max(hist.count for hist in hists.values())}
+            for metric, hist in hists.items():
+                summary[group].update(latency_summary(metric, hist))
+        return summary
+
+
+FLEET_RATES = ["Req/s", "InputTok/s", "OutputTok/s", "Goodput(req/s)"]
+
+
+def merge_server_results(results, percentiles=(50, 90, 99, 99.9)):
+    """One result for the servers of a test case, each a summary() as saved by save_case_result.
+
+    Counts and throughputs add up. Latencies come from the merged histograms, so the mean and
+    percentiles are over every request of the fleet. Results saved before the histograms existed
+    fall back to the mean of every server weighted by its #Req. "Imbalance" is the max/min ratio
+    of the servers' output throughput (#Req without throughputs). "Hist" holds the merged histograms.
+    """
+    merged = {"#Server": len(results), "#Req": sum(result.get("#Req", 0) for result in results), "Hist": {}}
+    for metric in LATENCY_METRICS:
+        hists = [result.get("Hist", {}).get(metric) for result in results]
+        if all(hists):
+            hist = LogHistogram()
+            for data in hists:
+                hist.merge(LogHistogram.from_dict(data))
+            if hist.count:
+                merged.update(latency_summary(metric, hist, percentiles))
+                merged["Hist"][metric] = hist.to_dict()
+        elif all(metric in result for result in results) and merged["#Req"]:
+            merged[metric] = sum(result[metric] * result.get("#Req", 0) for result in results) / merged["#Req"]
+    for rate in FLEET_RATES:
+        if all(rate in result for result in results):
+            merged[rate] = sum(result[rate] for result in results)
+    if "Goodput(req/s)" in merged and merged.get("Req/s"):
+        merged["Goodput(%)"] = merged["Goodput(req/s)"] / merged["Req/s"] * 100
+    balance = "OutputTok/s" if "OutputTok/s" in merged else "#Req"
+    loads = [result.get(balance, 0) for result in results]
+    merged["Imbalance"] = max(loads) / min(loads) if min(loads) > 0 else math.inf
+    return merged
+
+
+def meets_slo(ttft, tpot, slo_ttft_ms, slo_tpot_ms):
+    """Whether a request counts towards goodput. A limit of None is not checked."""
+    if slo_ttft_ms is not None and ttft * 1000 > slo_ttft_ms:
+        return False
+    if slo_tpot_ms is not None and tpot * 1000 > slo_tpot_ms:
+        return False
+    return True
+
+
+def stream_metrics_to_master(runner, collector, interval):
+    """Worker greenlet: send the metrics of the last `interval` seconds to the master until killed."""
+    import gevent
+    # Sleep to a fixed schedule, so message `Seq` always covers [Seq, Seq + 1) * interval after the start
+    start = time.time()
+    collector.seq = 0
+    while True:
+        gevent.sleep(max(0, start + (collector.seq + 1) * interval - time.time()))
+        runner.send_message('report_metrics_to_master', collector.pop_message(runner.client_id, final=False))
+
+
+def timeseries_path(out_json, target):
+    """e.g. LocustMetric/server0.json + model/3m_i2000_08user -> LocustMetric/server0_3m_i2000_08user_timeseries.csv"""
+    return f"{os.path.splitext(out_json)[0]}_{os.path.basename(target)}_timeseries.csv"
+
+
+def taipei_time():
+    gmt_plus_8 = pytz.timezone('Etc/GMT-8')
+    current_time = datetime.now(gmt_plus_8)
+    formatted_time = current_time.strftime('%Y-%m-%d %H:%M')
+    return "Taipei Time: " + formatted_time
+
+
+def save_case_result(out_json, server, target, result):
+    """Append `result` as [server][model_name][test_case] to the results store next to out_json,
+    where target = model_name/test_case. scripts/export_results.py turns the store into out_json."""
+    model_name = os.path.dirname(target)
+    test_case = os.path.basename(target)
+    append_result(results_path(out_json), server, model_name, test_case, {"Date": taipei_time(), **result})
@@ -0,0 +1,87 @@
+"""Append-only results store.
+
+Every finished test case is one JSON line {"Server", "Model", "TestCase", "Result"} appended with a
+single O_APPEND write, so saving costs the same for the 1st and the 100th case, concurrent writers
+never interleave a record, and a crash can at most lose the line being written. `load_nested`
+compacts the log back into the [server][model_name][test_case] layout of the outJson files;
+the last record of a test case wins.
+"""
+import json
+import os
+
+import orjson
+
+
+def results_path(out_json):
+    """report/server0.json -> report/server0.jsonl"""
+    return os.path.splitext(out_json)[0] + ".jsonl"
+
+
+def append_result(path, server, model_name, test_case, result):
+    line = orjson.dumps({"Server": server, "Model": model_name, "TestCase": test_case, "Result": result},
+                        option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b"\n":
+            line = b"\n" + line  # Don't glue the record onto a line torn by a crash
+        os.write(fd, line)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def iter_records(path):
+    with open(path, 'rb') as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # Only the tail can be torn by a crash; skip it instead of losing the whole file
+                print(f"Skip broken record at {path}:{n}")
+
+
+def load_nested(path, servers=("vLLM", "Triton")):
+    data = {name: {} for name in servers}
+    for record in iter_records(path):
+        models = data.setdefault(record["Server"], {})
+        models.setdefault(record["Model"], {})[record["TestCase"]] = record["Result"]
+    return data
+
+
+def load_result_file(path, servers=("vLLM", "Triton")):
+    """Nested results from either a .jsonl store or an already exported .json file."""
+    if path.endswith(".jsonl"):
+        return load_nested(path, servers)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_json_atomic(path, data):
+    """Write to a temp file and rename over `path`, so readers never see a half-written file."""
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def compact(path):
+    """Rewrite the log keeping only the latest record of every (server, model, test case)."""
+    latest = {}
+    for record in iter_records(path):
+        latest[(record["Server"], record["Model"], record["TestCase"])] = record
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        for record in latest.values():
+            f.write(orjson.dumps(record) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(latest)
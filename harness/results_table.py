@@ -0,0 +1,272 @@
+"""Results of all tests as one pandas table.
+
+Every source (locust result stores, OpenAI metric logs, benchmark_serving results and logs) becomes one row per
+(server, model, test_case) with the sweep dimensions parsed from the test case name as the rest of the
+index, e.g. 3m_i2000_08user -> dur=3m, ilen=2000, users=8 and i2000_o200_c4_p80 -> ilen=2000, olen=200,
+users=4, prompts=80. Any other <letters><number> token of a name becomes a dimension of its own, so a new
+sweep axis needs no code change. `pivot` lays any metrics out as a table and `write_tables` saves tables to
+.xlsx, .csv or .parquet.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import orjson
+import pandas as pd
+
+from harness.histogram import LogHistogram
+from harness.results_store import load_result_file
+
+KEYS = ["server", "model", "test_case"]
+# Test case token -> (dimension, type). Concurrency of benchmark_serving is the number of users of locust
+CASE_TOKENS = [
+    (re.compile(r"^(\d+[smh])$"), "dur", str),
+    (re.compile(r"^i(\d+)$"), "ilen", int),
+    (re.compile(r"^o(\d+)$"), "olen", int),
+    (re.compile(r"^(\d+)users?$"), "users", int),
+    (re.compile(r"^c(\d+)$"), "users", int),
+    (re.compile(r"^p(\d+)$"), "prompts", int),
+]
+OTHER_TOKEN = re.compile(r"^([A-Za-z]+)(\d+(?:\.\d+)?)$")
+# benchmark_serving --save-result --result-filename <test_case>.serving.json
+SERVING_RESULT = ".serving.json"
+# "Mean TTFT (ms):          45.12" in the benchmark_serving output
+LOG_METRIC = re.compile(r"^([^:=]+?):\s+(-?\d+(?:\.\d+)?)\s*$")
+
+
+def parse_test_case(test_case):
+    """Dimensions of a test case name, tokens split on '_'."""
+    dims = {}
+    for token in test_case.split("_"):
+        for pattern, dim, kind in CASE_TOKENS:
+            match = pattern.match(token)
+            if match:
+                dims[dim] = kind(match.group(1))
+                break
+        else:
+            match = OTHER_TOKEN.match(token)
+            if match:
+                value = match.group(2)
+                dims[match.group(1)] = float(value) if '.' in value else int(value)
+    return dims
+
+
+def from_records(records):
+    """Table indexed by KEYS + dimensions from dicts with the KEYS and any scalar metrics.
+    Nested values (histograms, groups) are left out."""
+    rows, dims = [], []
+    for record in records:
+        case_dims = parse_test_case(record["test_case"])
+        dims.extend(dim for dim in case_dims if dim not in dims)
+        row = {key: value for key, value in record.items() if not isinstance(value, (dict, list))}
+        row.update(case_dims)
+        rows.append(row)
+    if not rows:
+        return pd.DataFrame(index=pd.MultiIndex.from_arrays([[]] * len(KEYS), names=KEYS))
+    return pd.DataFrame(rows).set_index(KEYS + dims).sort_index()
+
+
+def dimensions(table):
+    return list(table.index.names[len(KEYS):])
+
+
+def concat(tables):
+    """One table from tables with different dimensions. A dimension missing from a table is NaN."""
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return from_records([])
+    dims = []
+    for table in tables:
+        dims.extend(dim for dim in dimensions(table) if dim not in dims)
+    flat = pd.concat([table.reset_index() for table in tables], ignore_index=True)
+    return flat.set_index(KEYS + dims).sort_index()
+
+
+def locust_records(path):
+    """Rows of a locust results store (.jsonl or exported .json). The server is the file name, e.g. server0."""
+    server = os.path.splitext(os.path.basename(path))[0]
+    for models in load_result_file(path).values():
+        for model, cases in models.items():
+            for test_case, result in cases.items():
+                yield {"server": server, "model": model, "test_case": test_case, **result}
+
+
+def store_folder(result_folder):
+    """Folder of the locust results stores of a MultiServer result folder, None without one.
+    server.sh and sweep.py write LocustMetric, older runs wrote benchmark."""
+    for sub in ("LocustMetric", "benchmark"):
+        folder = os.path.join(result_folder, sub)
+        if os.path.isdir(folder):
+            return folder
+    return None
+
+
+def store_files(folder):
+    """The locust results stores of a folder: every .jsonl, and an exported .json only without its .jsonl."""
+    files = sorted(os.listdir(folder))
+    stores = {os.path.splitext(file)[0] for file in files if file.endswith('.jsonl')}
+    return [os.path.join(folder, file) for file in files
+            if file.endswith('.jsonl') or (file.endswith('.json') and not file.endswith(SERVING_RESULT)
+                                           and os.path.splitext(file)[0] not in stores)]
+
+
+def load_locust_results(paths):
+    return from_records(record for path in paths for record in locust_records(path))
+
+
+def parse_benchmark_serving_log(path):
+    """Every 'Name (unit): value' line of a benchmark_serving output."""
+    metrics = {}
+    with open(path, 'r') as f:
+        for line in f:
+            match = LOG_METRIC.match(line.strip())
+            if match:
+                metrics[match.group(1)] = float(match.group(2))
+    return metrics
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of sorted values, linearly interpolated like numpy and benchmark_serving."""
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def serving_request_samples(data):
+    """Per-request TTFT, TPOT, ITL and E2EL (ms) of a benchmark_serving --save-detailed result."""
+    samples = {"TTFT": [], "TPOT": [], "ITL": [], "E2EL": []}
+    errors = data.get("errors") or [""] * len(data["ttfts"])
+    for ttft, itls, output_len, error in zip(data["ttfts"], data["itls"], data["output_lens"], errors):
+        if error or not ttft:
+            continue  # Failed request
+        e2el = ttft + sum(itls)
+        samples["TTFT"].append(ttft * 1000)
+        samples["E2EL"].append(e2el * 1000)
+        samples["ITL"].extend(itl * 1000 for itl in itls)
+        if output_len > 1:
+            samples["TPOT"].append((e2el - ttft) / (output_len - 1) * 1000)
+    return samples
+
+
+def parse_benchmark_serving_result(path, percentiles=(50, 90, 99)):
+    """The summary and the requested percentiles of a --save-result --save-detailed json, with the same
+    names as the log lines ("Mean TTFT (ms)", "P99 TTFT (ms)", ...). None if the file can't be read."""
+    try:
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError) as e:
+        print(f"Skip {path}: {e}")
+        return None
+    metrics = {
+        "Successful requests": data.get("completed"),
+        "Benchmark duration (s)": data.get("duration"),
+        "Total input tokens": data.get("total_input_tokens"),
+        "Total generated tokens": data.get("total_output_tokens"),
+        "Request throughput (req/s)": data.get("request_throughput"),
+        "Output token throughput (tok/s)": data.get("output_throughput"),
+        "Total Token throughput (tok/s)": data.get("total_token_throughput"),
+    }
+    metrics = {name: value for name, value in metrics.items() if value is not None}
+    if "ttfts" not in data:
+        return metrics  # --save-result without --save-detailed: the summary only
+    metrics["Hist"] = {}
+    for name, values in serving_request_samples(data).items():
+        if not values:
+            continue
+        hist = LogHistogram()
+        for value in values:
+            hist.record(value)
+        values.sort()
+        metrics[f"Mean {name} (ms)"] = hist.mean
+        for q in percentiles:
+            metrics[f"P{q:g} {name} (ms)"] = percentile(values, q)
+        # Keyed like the mean, so compare_results can test the difference of the means
+        metrics["Hist"][f"Mean {name} (ms)"] = hist.to_dict()
+    return metrics
+
+
+def benchmark_serving_records(folder, server="server0", percentiles=(50, 90, 99), workers=None):
+    """Rows of the <test_case>.serving.json results of a folder, parsed in parallel, and of the <test_case>.log
+    outputs without such a result. The model is the folder name. Missing or broken files are skipped."""
+    model = os.path.basename(os.path.normpath(folder))
+    files = sorted(os.listdir(folder))
+    results = [file for file in files if file.endswith(SERVING_RESULT)]
+    cases = [file[:-len(SERVING_RESULT)] for file in results]
+    paths = [os.path.join(folder, file) for file in results]
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    parse = partial(parse_benchmark_serving_result, percentiles=percentiles)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            parsed = list(executor.map(parse, paths))
+    else:
+        parsed = [parse(path) for path in paths]
+    for test_case, metrics in zip(cases, parsed):
+        if metrics:
+            yield {"server": server, "model": model, "test_case": test_case, **metrics}
+    for file in files:
+        if file.endswith(".log") and file[:-len(".log")] not in cases:
+            metrics = parse_benchmark_serving_log(os.path.join(folder, file))
+            if metrics:
+                yield {"server": server, "model": model, "test_case": file[:-len(".log")], **metrics}
+
+
+def load_benchmark_serving_logs(folder, server="server0", percentiles=(50, 90, 99)):
+    return from_records(benchmark_serving_records(folder, server, percentiles))
+
+
+def pivot(table, metrics, index="users", columns=None):
+    """Rows by `index`, columns by (*columns, metric). The columns default to the dimensions that vary within a row."""
+    flat = table.reset_index()
+    metrics = [metric for metric in metrics if metric in flat.columns]
+    if columns is None:
+        candidates = [dim for dim in dimensions(table) if dim != index and flat[dim].notna().all()]
+        # A dimension that is fixed for every row, like the #prompts of a concurrency, is not a column group
+        columns = [dim for dim in candidates if (flat.groupby(index)[dim].nunique() > 1).any()] or candidates
+    columns = list(columns)
+    if not columns:
+        return flat.groupby(index)[metrics].first()
+    out = flat.pivot_table(index=index, columns=columns, values=metrics, aggfunc="first")
+    # pivot_table sorts the metrics by name; keep the requested order inside every column group
+    keys = sorted({column[1:] for column in out.columns})
+    out = out[[(metric, *key) for key in keys for metric in metrics if (metric, *key) in out.columns]]
+    return out.reorder_levels([*range(1, len(columns) + 1), 0], axis=1)
+
+
+def flat_columns(table):
+    """ilen=2000|E2E style names for the formats without multi-level headers."""
+    if table.columns.nlevels == 1:
+        return table
+    names = table.columns.names
+    out = table.copy()
+    out.columns = ["|".join(f"{name}={value}" if name else str(value) for name, value in zip(names, column))
+                   for column in table.columns]
+    return out
+
+
+def write_tables(tables, path):
+    """Save [(title, table)] to one .xlsx sheet or .csv file stacked with a title row above each table,
+    or to one .parquet with a 'table' column."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        frames = [flat_columns(table).reset_index().assign(table=title) for title, table in tables]
+        pd.concat(frames, ignore_index=True).to_parquet(path, index=False)
+    elif ext == ".csv":
+        with open(path, 'w', newline='') as f:
+            for title, table in tables:
+                f.write(f"{title}\n")
+                table.to_csv(f)
+                f.write("\n")
+    elif ext == ".xlsx":
+        with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+            row = 0
+            for title, table in tables:
+                table.to_excel(writer, sheet_name="Report", startrow=row + 1)
+                writer.sheets["Report"].write(row, 0, title)
+                row += 1 + table.columns.nlevels + 1 + len(table) + 2
+    else:
+        raise ValueError(f"Unknown report format {path}. Use .xlsx, .csv or .parquet")
+    print(f"Save to {path}")
@@ -0,0 +1,133 @@
+"""Incremental parser for the SSE streams of vLLM and Triton-Inference-Server.
+
+The parser keeps one bytearray per response and scans it in place. It only looks at the few
+fields the benchmark needs, so streamed tokens are counted without decoding every event into
+Python objects or concatenating the generated text. Parsed events stay in the buffer, so the
+usage of the last event that carried one is located by offsets and decoded only when asked for.
+"""
+import orjson
+
+DELIMITER = b"\n\n"
+DATA_PREFIX = b"data:"
+DONE = b"[DONE]"
+USAGE_KEY = b'"usage":'
+ERROR_KEYS = (b'"error":', b'"object":"error"')
+WHITESPACE = b" \t\r\n"
+
+# Key of the generated text in a streamed event
+TEXT_KEYS = {
+    # {"model_name":"ensemble",...,"text_output":" What"}
+    "Triton": b'"text_output":',
+    # /v1/completions: {"choices":[{"index":0,"text":" What","logprobs":null,"finish_reason":null}]}
+    "completions": b'"text":',
+    # /v1/chat/completions: {"choices":[{"index":0,"delta":{"content":" won"},"finish_reason":null}]}
+    "chat": b'"content":',
+}
+
+
+class SSEStreamParser:
+    def __init__(self, text_key, keep_text=False):
+        """
+        text_key: one of TEXT_KEYS, or the raw bytes of the JSON key holding the generated text.
+        keep_text: also decode and keep the generated text. Only needed when the caller uses the reply.
+        """
+        self.text_key = TEXT_KEYS.get(text_key, text_key)
+        self.keep_text = keep_text
+        self.buffer = bytearray()
+        self.n_events = 0
+        self.n_tokens = 0         # Events carrying non-empty text. vLLM and Triton stream 1 token per event.
+        self.done = False
+        self.n_after_done = 0     # Events received after [DONE]
+        self._texts = []
+        self._pos = 0             # Start of the first unparsed event in buffer
+        self._usage_span = None   # (start, end) in buffer of the latest event with a non-null usage
+        self._usage = None
+
+    def feed(self, data):
+        """Append bytes read from the socket and parse every complete event. Return the number of new tokens."""
+        buf = self.buffer
+        buf += data
+        view = memoryview(buf)
+        start = self._pos
+        n_new = 0
+        try:
+            while True:
+                end = buf.find(DELIMITER, start)
+                if end < 0:
+                    break
+                n_new += self._parse_event(buf, view, start, end)
+                start = end + len(DELIMITER)
+        finally:
+            view.release()  # A bytearray cannot be resized while a memoryview is exported
+        self._pos = start
+        return n_new
+
+    def _parse_event(self, buf, view, start, end):
+        while start < end and buf[start] in WHITESPACE:
+            start += 1
+        if start == end:  # Some providers send empty lines between data chunks
+            return 0
+        if not buf.startswith(DATA_PREFIX, start, end):
+            raise ValueError(f"Unexpected chunk not starting with 'data': {bytes(view[start:end])}")
+        pos = skip_whitespace(buf, start + len(DATA_PREFIX), end)
+        if buf.startswith(DONE, pos, end):
+            self.done = True
+            return 0
+        if self.done:
+            self.n_after_done += 1
+        self.n_events += 1
+
+        for key in ERROR_KEYS:
+            if buf.find(key, pos, end) >= 0:
+                raise RuntimeError(f"Server returned an error: {bytes(view[pos:end])}")
+
+        usage = buf.find(USAGE_KEY, pos, end)
+        if usage >= 0 and buf[skip_whitespace(buf, usage + len(USAGE_KEY), end)] == ord('{'):
+            self._usage_span = (pos, end)  # With continuous_usage_stats every event has one, don't copy it
+            self._usage = None
+
+        # JSON strings can't contain an unescaped quote, so the first match is always the real key
+        key = buf.find(self.text_key, pos, end)
+        if key < 0:
+            return 0
+        value = skip_whitespace(buf, key + len(self.text_key), end)
+        if buf[value] != ord('"') or buf[value + 1] == ord('"'):  # null or ""
+            return 0
+        self.n_tokens += 1
+        if self.keep_text:
+            self._texts.append(orjson.loads(view[value:string_end(buf, value, end) + 1]))
+        return 1
+
+    @property
+    def usage(self):
+        """The usage dict of the latest event that carried one, e.g. the final usage chunk of vLLM."""
+        if self._usage is None and self._usage_span is not None:
+            start, end = self._usage_span
+            with memoryview(self.buffer) as view:  # Released at once, so feed() can still grow the buffer
+                self._usage = orjson.loads(view[start:end])["usage"]
+        return self._usage
+
+    @property
+    def text(self):
+        assert self.keep_text, "SSEStreamParser(keep_text=True) is required to get the generated text"
+        return "".join(self._texts)
+
+
+def skip_whitespace(buf, pos, end):
+    while pos < end and buf[pos] in WHITESPACE:
+        pos += 1
+    return pos
+
+
+def string_end(buf, quote, end):
+    """Index of the quote closing the JSON string that opens at `quote`."""
+    pos = quote
+    while True:
+        pos = buf.find(b'"', pos + 1, end)
+        if pos < 0:
+            raise ValueError(f"Unterminated string in event: {bytes(buf[quote:end])}")
+        n_backslash = 0
+        while buf[pos - 1 - n_backslash] == ord('\\'):
+            n_backslash += 1
+        if n_backslash % 2 == 0:
+            return pos
@@ -0,0 +1,39 @@
+"""Steady-state detection on a per-interval throughput series."""
+
+
+def mser_truncation(values, max_fraction=0.5):
+    """MSER (Marginal Standard Error Rule) truncation point.
+
+    Returns the number of leading values to drop: the d <= max_fraction * n minimizing
+    variance(values[d:]) / (n - d), i.e. the squared standard error of the mean of what remains.
+    Dropping ramp-up values lowers the variance faster than it shrinks the sample.
+    """
+    n = len(values)
+    if n < 4:
+        return 0
+    # Suffix sums give the mean and variance of every values[d:] in O(n)
+    suffix_sum = [0.0] * (n + 1)
+    suffix_sumsq = [0.0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        suffix_sum[i] = suffix_sum[i+1] + values[i]
+        suffix_sumsq[i] = suffix_sumsq[i+1] + values[i] * values[i]
+    best_d, best_stat = 0, None
+    for d in range(int(n * max_fraction) + 1):
+        m = n - d
+        mean = suffix_sum[d] / m
+        stat = max(suffix_sumsq[d] / m - mean * mean, 0) / m
+        if best_stat is None or stat < best_stat:
+            best_d, best_stat = d, stat
+    return best_d
+
+
+def steady_state_window(values):
+    """[start, end) indexes of the steady-state part of `values`.
+
+    MSER drops the warm-up at the head. Applied again on the reversed remainder it drops the
+    ramp-down at the tail, e.g. the last, partially filled interval when users stop.
+    """
+    start = mser_truncation(values)
+    tail = values[start:][::-1]
+    end = len(values) - mser_truncation(tail, max_fraction=0.25)
+    return start, end
@@ -0,0 +1,107 @@
+"""Per-interval time series built on the master from the workers' metric deltas."""
+import csv
+import os
+
+from harness.histogram import LogHistogram
+from harness.steady_state import steady_state_window
+
+COLUMNS = ["Time(s)", "Completed", "Req/s", "OutputTokens", "OutputTok/s", "InFlight",
+           "TTFT_P50", "TTFT_P90", "TTFT_P99", "E2E", "Steady"]
+
+
+class TimeSeries:
+    def __init__(self, interval):
+        self.interval = interval
+        self.t0 = None
+        self.rows = {}  # interval index -> counters, latest in-flight gauge per worker, histograms
+
+    def start(self, t0):
+        self.t0 = t0
+        self.rows = {}
+
+    def add(self, data):
+        """Add one worker message. It lands in the worker's own interval counter `Seq`, or without one in the
+        interval that contains its send time. Send times drift, so one interval could get 0 or 2 messages of a worker.
+        """
+        if self.t0 is None:
+            self.t0 = data["Time"] - self.interval
+        if "Seq" in data:
+            index = data["Seq"]
+        else:
+            index = max(0, int((data["Time"] - self.t0) // self.interval))
+        row = self.rows.setdefault(index, {
+            "Completed": 0, "OutputTokens": 0, "InFlight": {},
+            "TTFT": LogHistogram(), "E2E": LogHistogram(),
+        })
+        series = data["Series"]  # Every request, warm-up included
+        row["Completed"] += series["Counters"]["Completed"]
+        row["OutputTokens"] += series["Counters"]["OutputTokens"]
+        row["InFlight"][data["Worker"]] = data["InFlight"]
+        for metric in ("TTFT", "E2E"):
+            row[metric].merge(LogHistogram.from_dict(series["Hist"][metric]))
+
+    @property
+    def n_interval(self):
+        return max(self.rows) + 1 if self.rows else 0
+
+    def row(self, index):
+        """Intervals without messages are empty rows."""
+        empty = {"Completed": 0, "OutputTokens": 0, "InFlight": {}, "TTFT": LogHistogram(), "E2E": LogHistogram()}
+        return self.rows.get(index, empty)
+
+    def steady_state(self, warmup=0):
+        """Steady-state window detected on the per-interval throughput, and the metrics inside it.
+
+        Intervals that end before `warmup` seconds are never part of the window.
+        """
+        first = min(int(-(-warmup // self.interval)), self.n_interval)
+        completed = [self.row(index)["Completed"] for index in range(first, self.n_interval)]
+        start, end = steady_state_window(completed)
+        start, end = start + first, end + first
+        ttft, e2e = LogHistogram(), LogHistogram()
+        n_completed = n_tokens = 0
+        for index in range(start, end):
+            row = self.row(index)
+            n_completed += row["Completed"]
+            n_tokens += row["OutputTokens"]
+            ttft.merge(row["TTFT"])
+            e2e.merge(row["E2E"])
+        duration = (end - start) * self.interval
+        return {
+            "Start(s)": start * self.interval,
+            "End(s)": end * self.interval,
+            "Req/s": n_completed / duration if duration else 0,
+            "OutputTok/s": n_tokens / duration if duration else 0,
+            "TTFT_P50": ttft.percentile(50),
+            "TTFT_P99": ttft.percentile(99),
+            "E2E": e2e.mean,
+        }
+
+    def columns(self, warmup=0):
+        """Column name -> list of values, one value per interval."""
+        table = {column: [] for column in COLUMNS}
+        steady = self.steady_state(warmup)
+        for index in range(self.n_interval):
+            row = self.row(index)
+            table["Time(s)"].append(index * self.interval)
+            table["Completed"].append(row["Completed"])
+            table["Req/s"].append(row["Completed"] / self.interval)
+            table["OutputTokens"].append(row["OutputTokens"])
+            table["OutputTok/s"].append(row["OutputTokens"] / self.interval)
+            table["InFlight"].append(sum(row["InFlight"].values()))
+            table["TTFT_P50"].append(row["TTFT"].percentile(50))
+            table["TTFT_P90"].append(row["TTFT"].percentile(90))
+            table["TTFT_P99"].append(row["TTFT"].percentile(99))
+            table["E2E"].append(row["E2E"].mean)
+            table["Steady"].append(int(steady["Start(s)"] <= index * self.interval < steady["End(s)"]))
+        return table
+
+    def write_csv(self, path, warmup=0):
+        table = self.columns(warmup)
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*table.values()))
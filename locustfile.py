@@ -12,9 +12,26 @@ from datetime import datetime
 import pytz
 import logging
 import requests
-
-worker_data = {"#Req": [], "E2E": [], "TTFT": [], "TPOT": [], "Target":None}
-master_data = {"#Req": [], "E2E": [], "TTFT": [], "TPOT": [], "Target":None}
+from harness.sse import SSEStreamParser
+from harness.corpus import open_corpus
+from harness.mix import MixSampler, mix_from_options
+from harness.latency import TokenTimeline
+from harness.report import MetricsCollector, save_case_result, stream_metrics_to_master, timeseries_path, meets_slo
+from harness.timeseries import TimeSeries
+import gevent
+from locust.util.timespan import parse_timespan
+from locust.exception import StopUser
+from gevent.pool import Pool
+from harness.arrivals import poisson_arrivals, load_trace, trace_arrivals
+
+worker_metrics = MetricsCollector()
+master_metrics = MetricsCollector()
+master_timeseries = None
+streaming_greenlet = None
+warmup_end = 0  # perf_counter() before which requests are warm-up, set on test_start
+arrival_trace = None  # Arrival offsets of --arrival-trace, loaded once per process
+N_CORPUS_PROMPT = 100  # Pre-serialized prompts per user with --corpus
+prompt_cache = {}  # Prompt files of a length mix
 logging.basicConfig(level=logging.INFO) 
 logger = logging.getLogger(__name__) 
 
@@ -29,17 +46,29 @@ class LLMUser(HttpUser):
         self.endpoint = self.environment.parsed_options.endpoint
         self.output_tokens = self.environment.parsed_options.olen
         self.target = self.environment.parsed_options.target
+        self.id = LLMUser.UserIndex
 
         # Load dataset
         self.input_datafile = self.environment.parsed_options.ifile      
         with open(self.input_datafile, 'r') as file:
             self.prompt = file.read() 
-        self.words = self.prompt.split()
-        self.prompts = []
-        for i in range(100): # Generate random prompt
-            random.shuffle(self.words)
-            self.prompts.append(' '.join(self.words))
-        self.prompt_idx = 0
+        # Datasets/<ilen>.txt. Triton doesn't return usage, so the file name gives the input tokens
+        ilen = os.path.splitext(os.path.basename(self.input_datafile))[0]
+        self.input_tokens = int(ilen) if ilen.isdigit() else 0
+        self.prompts = [self.prompt]
+        if self.environment.parsed_options.shuffle_prompts:
+            self.words = self.prompt.split()
+            for i in range(self.environment.parsed_options.shuffle_prompts): # Generate random prompt
+                random.shuffle(self.words)
+                self.prompts.append(' '.join(self.words))
+        if self.environment.parsed_options.corpus:
+            # Distinct prompts of exact length from scripts/compile_prompt_set.py. Users read separate blocks.
+            corpus = open_corpus(self.environment.parsed_options.corpus)
+            n_prompt = min(len(corpus), N_CORPUS_PROMPT)
+            prompt_ids = corpus.user_indices(self.UserSlot() * n_prompt, n_prompt)
+            self.prompts = [corpus[i] for i in prompt_ids]
+            self.prompt = self.prompts[0]
+            self.input_tokens = corpus.token_lens[prompt_ids[0]]
 
                
         server_common_config = {
@@ -51,7 +80,10 @@ class LLMUser(HttpUser):
         vLLM_config = {
             "model": self.environment.parsed_options.hf_model,
             "prompt": self.prompt,
-            "ignore_eos": True                
+            "ignore_eos": True,
+            "stream_options": {
+                "include_usage": True  # Token counts for the throughput
+            }
         }
         triton_config = {
             "text_input": self.prompt,        
@@ -60,189 +92,258 @@ class LLMUser(HttpUser):
         
         if self.server == "vLLM":
             self.data = server_common_config | vLLM_config
+            self.prompt_key = "prompt"
+            self.text_key = "completions"
         elif self.server == "Triton":
             self.data = server_common_config | triton_config
+            self.prompt_key = "text_input"
+            self.text_key = "Triton"
+
+        # Serialize the request bodies once. SendRequest only picks a ready bytes object from the pool,
+        # so the greenlet doesn't spend CPU on json.dumps of a long prompt while other users are timestamping tokens.
+        self.body_pool = []
+        for prompt in self.prompts:
+            self.data[self.prompt_key] = prompt
+            self.body_pool.append(orjson.dumps(self.data))
+        self.data[self.prompt_key] = self.prompt
+        self.body_idx = 0
+        self.init_mix()
+        if LLMUser.UserIndex == 0:
+            report_body_serialization_saving(self.data, self.body_pool[0])
 
         # if self.environment.parsed_options.hf_model is not None:
         #     self.tokenizer = AutoTokenizer.from_pretrained(self.environment.parsed_options.hf_model)
 
-        # Result:
-        self.E2E = []
-        self.TTFT = []
-        self.TPOT = []
+        self.timeline = TokenTimeline(self.output_tokens + 8)
 
-        self.id = LLMUser.UserIndex
         self.n_completed_request = 0
+        self.n_sent_request = 0
         LLMUser.UserIndex += 1
-
-    def parse_output_json(self, data):
-        # Triton inference server
-        if self.server == 'Triton':
-            # e.g., {"model_name":"ensemble","model_version":"1","sequence_end":false,"sequence_id":0,"sequence_index":0,"sequence_start":false,"text_output":" What"}' with error KeyError('choices'
-            return data["text_output"]
-        elif self.server == 'vLLM':
-            assert len(data["choices"]) == 1, f"Too many choices {len(data['choices'])}"
-            choice = data["choices"][0]
-            text = choice["text"]
-            return text
-        
+        self.init_arrivals()
+
+    def init_mix(self):
+        # Length mix: every request draws an (ilen, olen) class. Prompts are <mix-folder>/<ilen>.txt
+        options = self.environment.parsed_options
+        self.mix_classes = mix_from_options(options)
+        if self.mix_classes is None:
+            return
+        folder = options.mix_folder or os.path.dirname(options.ifile)
+        self.mix_bodies = []
+        for c in self.mix_classes:
+            prompt = load_prompt(os.path.join(folder, f"{c.ilen}.txt"))
+            data = dict(self.data, max_tokens=c.olen)
+            data[self.prompt_key] = prompt
+            if self.server == "Triton":
+                data["min_length"] = c.olen
+            self.mix_bodies.append(orjson.dumps(data))
+        self.mix = MixSampler(self.mix_classes, seed=self.UserSlot())
+
+    def NextBody(self):
+        """Body, output length, input length and length class (None without a mix) of the next request."""
+        if self.mix_classes is None:
+            body = self.body_pool[self.body_idx]
+            self.body_idx = (self.body_idx + 1) % len(self.body_pool)
+            return body, self.output_tokens, self.input_tokens, None
+        k = self.mix.sample()
+        c = self.mix_classes[k]
+        return self.mix_bodies[k], c.olen, c.ilen, c.name
+
+    def UserSlot(self):
+        # Locust hands out users round-robin over the workers, so this numbers the users 0..n_user-1
+        options = self.environment.parsed_options
+        n_user = max(options.num_users or 1, 1)
+        n_process = options.processes or 1  # None without --processes
+        if n_process < 0:
+            n_process = os.cpu_count()  # --processes -1
+        worker_index = getattr(self.environment.runner, "worker_index", 0)
+        return (self.id * n_process + worker_index) % n_user
+
+    def init_arrivals(self):
+        # Open loop: requests go out at the arrival times, independent of completion.
+        # Every user is an independent share of the total --arrival-rate or of the --arrival-trace.
+        global arrival_trace
+        options = self.environment.parsed_options
+        self.arrivals = None
+        if options.arrival_rate is None and options.arrival_trace is None:
+            return
+        n_user = max(options.num_users or 1, 1)
+        slot = self.UserSlot()
+        t0 = time.perf_counter()
+        if options.arrival_trace is not None:
+            if arrival_trace is None:
+                arrival_trace = load_trace(options.arrival_trace)
+            self.arrivals = trace_arrivals(arrival_trace, t0, slot, n_user)
+        else:
+            self.arrivals = poisson_arrivals(options.arrival_rate / n_user, t0, seed=slot)
+        # Arrivals beyond the cap wait on the client. That wait is reported as Queue, apart from E2E.
+        self.outstanding = Pool(max(1, -(-options.max_outstanding // n_user)))
 
     @task
     def SendRequest(self):
-        # if self.server == "vLLM":
-        #     self.data["prompt"] = self.prompts[self.prompt_idx]
-        # elif self.server == "Triton":
-        #     self.data["text_input"] = self.prompts[self.prompt_idx]
-        # self.prompt_idx=(1+self.prompt_idx)%100
-        
+        if self.arrivals is None:
+            # Closed loop: the next request goes out as soon as the previous one finishes
+            self.PostRequest(self.timeline)
+            return
+        t_arrival = next(self.arrivals, None)
+        if t_arrival is None:  # End of the trace
+            self.outstanding.join()
+            raise StopUser()
+        gevent.sleep(max(0, t_arrival - time.perf_counter()))
+        self.outstanding.spawn(self.OpenLoopRequest, TokenTimeline(self.output_tokens + 8), t_arrival)
+
+    def OpenLoopRequest(self, timeline, t_arrival):
+        # Not run inside the locust task, so its error handling never sees an exception of this greenlet.
+        # Report it as a failed request instead of letting gevent print it and drop it.
+        t_start = time.perf_counter()
+        try:
+            self.PostRequest(timeline, t_arrival)
+        except Exception as e:
+            print(f"Failed request with error {repr(e)}")
+            self.environment.events.request.fire(
+                request_type="POST", name=self.endpoint, response_time=(time.perf_counter() - t_start) * 1000,
+                response_length=0, response=None, context={}, exception=e)
+
+    def PostRequest(self, timeline, t_arrival=None):
+        body, output_tokens, input_tokens, length_class = self.NextBody()
+
         t_start = time.perf_counter()
         headers = {"Content-Type": "application/json"}
-        with self.client.post(
-            self.endpoint,
-            data=json.dumps(self.data),
-            headers=headers,
-            stream=False,
-            catch_response=True,
-        ) as response:
-
-            combined_text = ""
-            t_first_token = None
-            done = False
+        # Warm-up requests (graph capture, cold KV cache) only show up in the time series
+        measured = (time.perf_counter() >= warmup_end and
+                    self.n_sent_request >= self.environment.parsed_options.warmup_requests)
+        self.n_sent_request += 1
+        worker_metrics.count("Started")
+        worker_metrics.in_flight += 1
+        try:
+            with self.client.post(
+                self.endpoint,
+                data=body,
+                headers=headers,
+                stream=True,
+                catch_response=True,
+            ) as response:
+
+                t_first_token = None
             
-            try:
-                response.raise_for_status()
-            except Exception as e:
-                raise RuntimeError(f"Error in response: {response.text}") from e
-
-            for chunk in response.iter_lines(delimiter=b"\n\n"):
-                if len(chunk) == 0:
-                    # print("come providers send empty lines between data chunks")
-                    continue 
-                if done:
-                    if chunk != b"data: [DONE]":
-                        print(f"WARNING: Received more chunks after [DONE]: {chunk}")
-
                 try:
-                    now = time.perf_counter()
-
-                    # Stream
-                    assert chunk.startswith(b"data:"), f"Unexpected chunk not starting with 'data': {chunk}"
-                    chunk = chunk[len(b"data:") :]
-                    if chunk.strip() == b"[DONE]":
-                        done = True
-                        continue
-                    data = orjson.loads(chunk)
-                    text = self.parse_output_json(data)
-                    combined_text += text
-
-                    if combined_text and t_first_token is None:
-                        t_first_token = now
+                    response.raise_for_status()
+                except Exception as e:
+                    raise RuntimeError(f"Error in response: {response.text}") from e
 
+                parser = SSEStreamParser(self.text_key)
+                timeline.reset()
+                try:
+                    for chunk in response.iter_content(chunk_size=None):
+                        now = time.perf_counter()
+                        if parser.feed(chunk):
+                            timeline.record(now)
+                            if t_first_token is None:
+                                t_first_token = now
                 except Exception as e:
-                    print(f"Failed to parse response: {chunk} with error {repr(e)}")
+                    print(f"Failed to parse response with error {repr(e)}")
                     response.failure(e)
                     return
-
-            now = time.perf_counter()
-            E2E_Latency = now - t_start
-            TTFT = t_first_token - t_start
-            GenerationT = now - t_first_token
-            TPOT = GenerationT / (self.output_tokens-1)
-            # print(f"User #{self.id}, req #{self.n_completed_request}, "
-            #       f"E2E_Latency(s) = {E2E_Latency:.2f}, TTFT(s)={TTFT:.2f}, TPOT(s)={TPOT:.3f} \n"
-            #       f"# output tokens: {len(self.tokenizer.encode(combined_text))}, required output tokens: {self.output_tokens} \n"
-            #       f"Prompt: {self.data['prompt'][:1000]}  \n"
-            #       f"Generated tokens: {combined_text}\n"
-            #       f"------------------\n")
-            self.n_completed_request += 1
-            self.E2E.append(E2E_Latency)
-            self.TTFT.append(TTFT)
-            self.TPOT.append(TPOT)
-            # print("=======================================================")
+                if parser.n_after_done:
+                    print(f"WARNING: Received {parser.n_after_done} more chunks after [DONE]")
+
+                now = time.perf_counter()
+                E2E_Latency = now - t_start
+                TTFT = t_first_token - t_start
+                GenerationT = now - t_first_token
+                TPOT = GenerationT / (output_tokens-1)
+                # print(f"User #{self.id}, req #{self.n_completed_request}, "
+                #       f"E2E_Latency(s) = {E2E_Latency:.2f}, TTFT(s)={TTFT:.2f}, TPOT(s)={TPOT:.3f} \n"
+                #       f"# output tokens: {len(self.tokenizer.encode(combined_text))}, required output tokens: {self.output_tokens} \n"
+                #       f"Prompt: {self.data['prompt'][:1000]}  \n"
+                #       f"Generated tokens: {combined_text}\n"
+                #       f"------------------\n")
+                worker_metrics.record_series(TTFT, E2E_Latency, parser.n_tokens)
+                if not measured:
+                    worker_metrics.count("Warmup")
+                    return
+                usage = parser.usage or {}
+                self.n_completed_request += 1
+                worker_metrics.count("Completed")
+                worker_metrics.count("InputTokens", usage.get("prompt_tokens", input_tokens))
+                worker_metrics.count("OutputTokens", usage.get("completion_tokens", parser.n_tokens))
+                if meets_slo(TTFT, TPOT, self.environment.parsed_options.slo_ttft_ms,
+                             self.environment.parsed_options.slo_tpot_ms):
+                    worker_metrics.count("Good")
+                worker_metrics.record("E2E", E2E_Latency)
+                worker_metrics.record("TTFT", TTFT)
+                worker_metrics.record("TPOT", TPOT)
+                if length_class is not None:
+                    for metric, value in (("E2E", E2E_Latency), ("TTFT", TTFT), ("TPOT", TPOT)):
+                        worker_metrics.record_group(length_class, metric, value)
+                if t_arrival is not None:
+                    worker_metrics.record("Queue", t_start - t_arrival)
+                for itl in timeline.itls():
+                    worker_metrics.record("ITL", itl)
+                # print("=======================================================")
+        finally:
+            worker_metrics.in_flight -= 1
 
     def on_stop(self):
-        # Summarize the benchmark
+        if self.arrivals is not None:
+            self.outstanding.kill()
         if self.n_completed_request == 0:
             print(f"Warning: User {self.id}, #completed_request is 0. Increase [-t] or reduce user number.")
-            avg_E2E = avg_TTFT = avg_TPOT = 0
-        else:
-            avg_E2E = sum(self.E2E) / self.n_completed_request
-            avg_TTFT = sum(self.TTFT) / self.n_completed_request
-            avg_TPOT = sum(self.TPOT) / self.n_completed_request
-        
-        worker_data["#Req"].append(self.n_completed_request)
-        worker_data["E2E"].append(avg_E2E)
-        worker_data["TTFT"].append(avg_TTFT)
-        worker_data["TPOT"].append(avg_TPOT)
-        worker_data["Target"] = self.target
+        worker_metrics.add_user(self.n_completed_request, self.target)
+
+
+def load_prompt(path):
+    # Read once per process, users of a mix share the strings
+    if path not in prompt_cache:
+        with open(path, 'r') as file:
+            prompt_cache[path] = file.read()
+    return prompt_cache[path]
+
+
+def report_body_serialization_saving(data, body, n_iter=20):
+    # Compare the per-request cost of the old `json.dumps(self.data)` path with the pre-serialized body.
+    t_start = time.perf_counter()
+    for _ in range(n_iter):
+        old_body = json.dumps(data).encode()
+    dumps_ms = (time.perf_counter() - t_start) / n_iter * 1000
+    logger.info(f"Pre-serialized request body: {len(body)} bytes (json.dumps sent {len(old_body)} bytes). "
+                f"Saves {len(old_body) - len(body)} bytes and {dumps_ms:.3f} ms of serialization per request.")
 
 
 def report_metrics_to_master(environment, msg):
-    global master_data
-    master_data["#Req"]+=msg.data["#Req"]
-    master_data["E2E"]+=msg.data["E2E"]
-    master_data["TTFT"]+=msg.data["TTFT"]
-    master_data["TPOT"]+=msg.data["TPOT"]
-    master_data["Target"]=msg.data["Target"]
-    # print(f"[DEBUG] msg={msg.data}")
-    # print(f"  master_data={master_data}")
-    
-    n_user = len(master_data["#Req"])
-    if n_user == 0: # When user = 1, processes = 4, not every process handle at least 1 user.
+    # Workers send their metric deltas every --report-interval seconds and once more at test_stop (Final)
+    master_metrics.merge_message(msg.data)
+    master_timeseries.add(msg.data)
+    if not msg.data["Final"]:
+        return
+    warmup = parse_timespan(environment.parsed_options.warmup)
+    master_timeseries.write_csv(timeseries_path(environment.parsed_options.outJson, environment.parsed_options.target),
+                                warmup)
+    if master_metrics.n_user == 0: # When user = 1, processes = 4, not every process handle at least 1 user.
         return
-    n_req = sum(master_data["#Req"])
-    # print("Only show the first 8 users results:")
-    # for i in range(min(n_user,8)):
-    #     print(f"User #{i:3d}, Completed Request = {master_data['#Req'][i]}, "
-    #         f"E2E(s) = {master_data['E2E'][i]:.2f}, "
-    #         f"TTFT(s) = {master_data['TTFT'][i]:.2f}, "
-    #         f"TPOT(s) = {master_data['TPOT'][i]:.3f} ")
-
-    ave_E2E = sum(master_data['E2E']) / n_user
-    ave_TTFT = sum(master_data['TTFT']) / n_user
-    ave_TPOT = sum(master_data['TPOT']) / n_user
-
-    # Save result
-    # Save to a JSON file
-    if os.path.exists(environment.parsed_options.outJson):
-        with open(environment.parsed_options.outJson, 'r') as f:
-            data = json.load(f)  # Load JSON data as a Python dictionary
-    else:
-        data = dict()
-        data["vLLM"] = dict()
-        data["Triton"] = dict()
-    server = environment.parsed_options.server
-    key = environment.parsed_options.target
-    model_name = os.path.dirname(key)
-    test_case = os.path.basename(key)
-    if server not in data:
-        data[server] = {}
-    if model_name not in data[server]:
-        data[server][model_name] = {}
-    
-    gmt_plus_8 = pytz.timezone('Etc/GMT-8')
-    current_time = datetime.now(gmt_plus_8)
-    formatted_time = current_time.strftime('%Y-%m-%d %H:%M')
-    date = "Taipei Time: " + formatted_time
-
-    data[server][model_name][test_case] = {
-        "Date": date,
-        "#Req": n_req,
-        "E2E": ave_E2E,
-        "TTFT": ave_TTFT,
-        "TPOT": ave_TPOT
-    }
-    # print(f"data = {data}")
 
-    with open(environment.parsed_options.outJson, 'w') as f:
-        json.dump(data, f, indent=4)  # Save with indentation for readability
-        # print(f"[DEBUG] json data=", data)
-        # print(f"[DEBUG] outJson={outJson}")
+    # Request-weighted mean and percentiles over the merged histograms of all workers
+    # The measured window runs from the end of the warm-up to the latest worker message
+    duration = master_metrics.last_time - (master_timeseries.t0 + warmup)
+    result = master_metrics.summary(environment.parsed_options.stall_factor, duration=duration,
+                                    slo_ttft_ms=environment.parsed_options.slo_ttft_ms,
+                                    slo_tpot_ms=environment.parsed_options.slo_tpot_ms)
+    result["Warmup"] = {
+        "Duration(s)": warmup,
+        "Requests/user": environment.parsed_options.warmup_requests,
+        "#Excluded": master_metrics.counters["Warmup"],
+    }
+    result["SteadyState"] = master_timeseries.steady_state(warmup)
+    if environment.parsed_options.arrival_rate is not None:
+        result["OfferedRate(req/s)"] = environment.parsed_options.arrival_rate
+    save_case_result(environment.parsed_options.outJson, environment.parsed_options.server,
+                     environment.parsed_options.target, result)
 
 @events.init.add_listener
 def on_locust_init(environment, **_kwargs):
+    global master_timeseries
     if isinstance(environment.runner, MasterRunner):
         environment.runner.register_message('report_metrics_to_master', report_metrics_to_master)
+        master_timeseries = TimeSeries(environment.parsed_options.report_interval or 1)
         if environment.parsed_options.rpd_profile:
             logger.info(f"host = {environment.parsed_options.host} ")
             response = requests.post(environment.parsed_options.host+"/start_profile")
@@ -253,10 +354,24 @@ def on_locust_init(environment, **_kwargs):
     elif isinstance(environment.runner, WorkerRunner):
         pass
 
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    global streaming_greenlet, warmup_end
+    if isinstance(environment.runner, MasterRunner):
+        master_timeseries.start(time.time())
+    elif isinstance(environment.runner, WorkerRunner):
+        warmup_end = time.perf_counter() + parse_timespan(environment.parsed_options.warmup)
+        if environment.parsed_options.report_interval > 0:
+            streaming_greenlet = gevent.spawn(stream_metrics_to_master, environment.runner, worker_metrics,
+                                              environment.parsed_options.report_interval)
+
 @events.test_stop.add_listener
 def on_test_stop(environment, **kwargs):
     if isinstance(environment.runner, MasterRunner):
         #print("[DEBUG] I'm on master node")
+        # Keep the time series of workers that never send their final message
+        master_timeseries.write_csv(timeseries_path(environment.parsed_options.outJson, environment.parsed_options.target),
+                                    parse_timespan(environment.parsed_options.warmup))
         if environment.parsed_options.rpd_profile:
             response = requests.post(environment.parsed_options.host+"/stop_profile")
             if response.status_code == 200:
@@ -265,7 +380,10 @@ def on_test_stop(environment, **kwargs):
                 logger.info(f"Fail to end rpd profiling ")
     elif isinstance(environment.runner, WorkerRunner):
         # print(f"[DEBUG] I'm on worker node.")
-        environment.runner.send_message('report_metrics_to_master', worker_data)
+        if streaming_greenlet is not None:
+            streaming_greenlet.kill()
+        environment.runner.send_message('report_metrics_to_master',
+                                        worker_metrics.pop_message(environment.runner.client_id, final=True))
 
 
 @events.init_command_line_parser.add_listener
@@ -314,6 +432,91 @@ def init_parser(parser):
         help=("Path to HF model folder. If not specified we will use env var MODEL_PATH.\n"
               "Required by vLLM server. Also, we use tokenizer to debug the token lengths.")
     )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        help="Prompt set compiled by scripts/compile_prompt_set.py (e.g. Datasets/2000.corpus). Replaces -ifile's prompt",
+    )
+    parser.add_argument(
+        "--mix-ilen",
+        type=str,
+        help="Weighted input lengths of a length mix, e.g. 2000:5,4400:3,8600:2. Overrides -ifile",
+    )
+    parser.add_argument(
+        "--mix-olen",
+        type=str,
+        help="Weighted output lengths of a length mix, e.g. 200:7,1000:3. Default: -olen",
+    )
+    parser.add_argument(
+        "--mix-hist",
+        type=str,
+        help=("Replay the (input, output) length histogram of a CSV trace (input_len/output_len or BurstGPT "
+              "columns), snapped to the --mix-ilen/--mix-olen values"),
+    )
+    parser.add_argument(
+        "--mix-folder",
+        type=str,
+        help="Folder of the <ilen>.txt prompts of a length mix. Default: the folder of -ifile",
+    )
+    parser.add_argument(
+        "--shuffle-prompts",
+        type=int,
+        default=0,
+        help=("Number of word-shuffled variants of the input prompt to pre-serialize per user. "
+              "Requests rotate over the original prompt and its variants. Default 0 sends the same prompt every time.")
+    )
+    parser.add_argument(
+        "--stall-factor",
+        type=float,
+        default=3.0,
+        help="An inter-token latency longer than stall-factor x the median ITL is counted as a decode stall (#Stall)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=str,
+        default="0",
+        help=("Drop requests sent during the first part of the test from the metrics, e.g. 30s, 1m. "
+              "They still show up in the time series."),
+    )
+    parser.add_argument(
+        "--warmup-requests",
+        type=int,
+        default=0,
+        help="Drop the first n requests of every user from the metrics",
+    )
+    parser.add_argument(
+        "--slo-ttft-ms",
+        type=float,
+        help="TTFT limit of the goodput SLO. Goodput counts the requests meeting every given limit",
+    )
+    parser.add_argument(
+        "--slo-tpot-ms",
+        type=float,
+        help="TPOT limit of the goodput SLO",
+    )
+    parser.add_argument(
+        "--arrival-rate",
+        type=float,
+        help=("Open-loop mode: total Poisson arrival rate (req/s) over all users, independent of completion. "
+              "Without it each user sends the next request when the previous one finishes."),
+    )
+    parser.add_argument(
+        "--arrival-trace",
+        type=str,
+        help="Open-loop mode: replay the arrival timestamps (s, first column) of this trace file",
+    )
+    parser.add_argument(
+        "--max-outstanding",
+        type=int,
+        default=1024,
+        help="Open-loop mode: cap of in-flight requests over all users. Later arrivals queue on the client",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=5,
+        help="Workers push metric deltas to the master every n seconds for the time series. 0: only at the end",
+    )
     parser.add_argument("--rpd-profile", action="store_true", help="Activate profiling for ROCm/vLLM")
 
 '''
@@ -332,4 +535,12 @@ locust --server Triton --hf-model $MODEL_PATH \
     -ifile Datasets/2500.txt -olen 350 -out report/ \
     --headless --only-summary --csv report/report --html report/report.html
 
+
+Length mix (2000/4400/8600-token prompts x 200/1000 output tokens, results per class under "Groups"):
+locust --server vLLM --hf-model $MODEL_PATH \
+    --host http://localhost:${SERVER_PORT} --endpoint /v1/completions \
+    -t 3m -u 64 -r 64 --processes 16 \
+    -ifile Datasets/2000.txt -olen 200 --mix-ilen 2000:5,4400:3,8600:2 --mix-olen 200:7,1000:3 \
+    -outJson report/server0.json -target Llama-3.1-8B/3m_mix_64user --headless --only-summary
+
 '''
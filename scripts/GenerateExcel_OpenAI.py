@@ -4,144 +4,72 @@ import json
 import argparse
 from datetime import datetime
 import pytz
-import pandas as pd
-import xlsxwriter
-
-
-
-def parse_log_file(filepath, grouped_metrics):
-    """Parses a single log file and extracts relevant metrics."""
-    generation_tokens = 0.0  # Initialize generation tokens
-    
-    with open(filepath, 'r') as f:
-        for line in f:
-            if line.startswith("vllm:request_success_total{finished_reason=\"length\""):
-                value = float(line.split()[-1])
-                grouped_metrics["request_success_total"].append(value)
-            elif line.startswith("vllm:prompt_tokens_total"):
-                value = float(line.split()[-1])
-                grouped_metrics["prompt_tokens_total"].append(value)
-            elif line.startswith("vllm:generation_tokens_total"):
-                value = float(line.split()[-1])
-                grouped_metrics["generation_tokens_total"].append(value)
-            elif line.startswith("vllm:iteration_tokens_total_sum"):
-                value = float(line.split()[-1])
-                grouped_metrics["iteration_tokens_total_sum"].append(value)
-            elif line.startswith("vllm:request_inference_time_seconds_sum"):
-                value = float(line.split()[-1])
-                grouped_metrics["request_inference_time_seconds_sum"].append(value)
-            elif line.startswith("vllm:e2e_request_latency_seconds_sum"):
-                value = float(line.split()[-1])
-                grouped_metrics["e2e_request_latency_seconds_sum"].append(value)
-            elif line.startswith("vllm:time_to_first_token_seconds_sum"): 
-                value = float(line.split()[-1])
-                grouped_metrics["time_to_first_token_seconds_sum"].append(value)
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.prometheus import MetricTable
+from harness.results_table import from_records, pivot, write_tables
+
+
+
+LOG_NAME = re.compile(r"^(.+)_server\d+\.log$")
+# Column -> (vLLM sample, labels it must have). Samples are summed over the servers of a case and other labels.
+COUNTERS = {
+    "request_success_total": ("vllm:request_success_total", {"finished_reason": "length"}),
+    "prompt_tokens_total": ("vllm:prompt_tokens_total", {}),
+    "generation_tokens_total": ("vllm:generation_tokens_total", {}),
+    "iteration_tokens_total_sum": ("vllm:iteration_tokens_total_sum", {}),
+    "request_inference_time_seconds_sum": ("vllm:request_inference_time_seconds_sum", {}),
+    "e2e_request_latency_seconds_sum": ("vllm:e2e_request_latency_seconds_sum", {}),
+    "time_to_first_token_seconds_sum": ("vllm:time_to_first_token_seconds_sum", {}),
+}
+# Percentiles (ms) from the histogram buckets of all servers of a case
+PERCENTILES = {
+    "time_to_first_token": ("vllm:time_to_first_token_seconds", (50, 90, 99)),
+    "e2e_request_latency": ("vllm:e2e_request_latency_seconds", (50, 90, 99)),
+    "time_per_output_token": ("vllm:time_per_output_token_seconds", (50, 90, 99)),
+}
 
 def process_log_files(log_folder, n_server):
     final_metrics = []
 
-    # filenames: 10s_i2000_01user_server0.log
-    TIME = "3m"
-    N_USER = [1, 8, 16, 24, 32, 40, 48, 56, 64, 96, 128, 196]
-    IO_LEN = ["i2000", "i4400", "i8600"]
-
-    for n_user in N_USER:
-        for io_len in IO_LEN:
-            grouped_metrics = {
-                "request_success_total": [],
-                "prompt_tokens_total": [],
-                "generation_tokens_total": [],
-                "iteration_tokens_total_sum": [],
-                "request_inference_time_seconds_sum": [],
-                "e2e_request_latency_seconds_sum": [],
-                "time_to_first_token_seconds_sum": [],
-            }
-
-            exist = True
-            for server_idx in range(n_server):
-                log_filename = f"{TIME}_{io_len}_{n_user:02d}user_server{server_idx}.log"
-                log_path = os.path.join(log_folder, log_filename)
-
-                if os.path.exists(log_path) == False:
-                    exist = False
-                    # print(f"{log_path} not existed, skip...")
-                else:
-                    print(log_path)
-                    parse_log_file(log_path, grouped_metrics)
-            
-            if exist:
-                grouped_metrics["request_success_total"] = sum(grouped_metrics["request_success_total"])
-                grouped_metrics["prompt_tokens_total"] = sum(grouped_metrics["prompt_tokens_total"])
-                grouped_metrics["generation_tokens_total"] = sum(grouped_metrics["generation_tokens_total"])
-                grouped_metrics["iteration_tokens_total_sum"] = sum(grouped_metrics["iteration_tokens_total_sum"])
-                grouped_metrics["request_inference_time_seconds_sum"] = \
-                    sum(grouped_metrics["request_inference_time_seconds_sum"]) / grouped_metrics["request_success_total"] * 1000
-                grouped_metrics["e2e_request_latency_seconds_sum"] = \
-                    sum(grouped_metrics["e2e_request_latency_seconds_sum"]) / grouped_metrics["request_success_total"] * 1000
-                grouped_metrics["time_to_first_token_seconds_sum"] = \
-                    sum(grouped_metrics["time_to_first_token_seconds_sum"]) / grouped_metrics["request_success_total"] * 1000
-
-                final_metrics.append({f"{TIME}_{io_len}_{n_user:02d}user": grouped_metrics})
+    # filenames: 10s_i2000_01user_server0.log. Every test case with the logs of all servers is reported
+    cases = {}
+    for file in sorted(os.listdir(log_folder)):
+        match = LOG_NAME.match(file)
+        if match:
+            cases.setdefault(match.group(1), []).append(os.path.join(log_folder, file))
+    cases = {test_case: paths for test_case, paths in cases.items() if len(paths) == n_server}
+    table = MetricTable.load([path for paths in cases.values() for path in paths])
+
+    for test_case, paths in cases.items():
+        grouped_metrics = {column: table.value(paths, name, **labels) for column, (name, labels) in COUNTERS.items()}
+        n_request = grouped_metrics["request_success_total"]
+        for column in ("request_inference_time_seconds_sum", "e2e_request_latency_seconds_sum",
+                       "time_to_first_token_seconds_sum"):
+            grouped_metrics[column] = grouped_metrics[column] / n_request * 1000 if n_request else 0
+        for column, (family, percentiles) in PERCENTILES.items():
+            for q in percentiles:
+                value = table.percentile(paths, family, q)
+                grouped_metrics[f"{column}_P{q}(ms)"] = value * 1000 if value is not None else None
+        final_metrics.append({test_case: grouped_metrics})
     return final_metrics
 
-Dur = "3m"
-I_Len = ["i2000", "i4400", "i8600"]
-N_User = [1, 8, 16, 24, 32, 40, 48, 56, 64, 96, 128, 196]
-
-def FillInExcelTemplate(row, col, model, N_User, worksheet):
-    worksheet.write(row, col, model)
-    worksheet.write(row+2, col+1, "i2000-o150")
-    worksheet.write(row+2, col+5, "i4400-o150")
-    worksheet.write(row+2, col+9, "i8600-o150")
-
-    for i in range(3):
-        offset = i*6
-        worksheet.write(row+3, col+1+offset, "request_success_total")
-        worksheet.write(row+3, col+2+offset, "prompt_tokens_total")
-        worksheet.write(row+3, col+3+offset, "generation_tokens_total")
-        worksheet.write(row+3, col+4+offset, "iteration_tokens_total_sum")
-        worksheet.write(row+3, col+5+offset, "time_to_first_token_seconds_sum(ms)")
-        worksheet.write(row+3, col+6+offset, "e2e_request_latency_seconds_sum(ms)")
-    
-    # Column title
-    worksheet.write(row+2, col, "ilen/olen")
-    worksheet.write(row+3, col, "#User")
-    row_offset = 4
-    for n_user in N_User:
-        worksheet.write(row+row_offset, col, str(n_user))
-        row_offset+=1
+# Excel column title of each reported metric
+COLUMN_TITLES = {
+    "time_to_first_token_seconds_sum": "time_to_first_token_seconds_sum(ms)",
+    "e2e_request_latency_seconds_sum": "e2e_request_latency_seconds_sum(ms)",
+}
 
 
 def GenerateExcel(output_json, model_name, output_xlsx_filepath):
-    workbook = xlsxwriter.Workbook(output_xlsx_filepath)
-    worksheet = workbook.add_worksheet()
-
-    # Excel (x,y) position
-    row, col = 0, 0
-    row_offset_nuser = {n_user: offset + 4 for offset, n_user in enumerate(N_User)}
-    col_offset_ilen={"i2000":1, "i4400":7, "i8600":13}
-
-    FillInExcelTemplate(row, col, model_name, N_User, worksheet)
-
-    for ilen in I_Len:
-        for n_user in N_User:
-            n_user_str = "{:02}".format(n_user) + "user"
-            dur_ilen_user = '_'.join([Dur, ilen, n_user_str])
-            # print(output_json)
-            for item in output_json:
-                if dur_ilen_user in item:
-                    r_offset = row_offset_nuser[n_user]
-                    c_offset = col_offset_ilen[ilen]
-                    worksheet.write(row+r_offset, col+c_offset+0, item[dur_ilen_user]["request_success_total"])
-                    worksheet.write(row+r_offset, col+c_offset+1, item[dur_ilen_user]["prompt_tokens_total"])
-                    worksheet.write(row+r_offset, col+c_offset+2, item[dur_ilen_user]["generation_tokens_total"])
-                    worksheet.write(row+r_offset, col+c_offset+3, item[dur_ilen_user]["iteration_tokens_total_sum"])
-                    worksheet.write(row+r_offset, col+c_offset+4, item[dur_ilen_user]["time_to_first_token_seconds_sum"])
-                    worksheet.write(row+r_offset, col+c_offset+5, item[dur_ilen_user]["e2e_request_latency_seconds_sum"])
-                    # worksheet.write(row+r_offset, col+c_offset+3, item[dur_ilen_user]["TPOT"])       
-    row+=17   
-    print(f"Save to {output_xlsx_filepath}\n")
-    workbook.close()
+    records = [{"server": "ALL", "model": model_name, "test_case": test_case, **metrics}
+               for item in output_json for test_case, metrics in item.items()]
+    table = from_records(records)
+    columns = ["request_success_total", "prompt_tokens_total", "generation_tokens_total",
+               "iteration_tokens_total_sum", "time_to_first_token_seconds_sum", "e2e_request_latency_seconds_sum"]
+    columns += [f"{column}_P{q}(ms)" for column, (_, percentiles) in PERCENTILES.items() for q in percentiles]
+    write_tables([(model_name, pivot(table, columns).rename(columns=COLUMN_TITLES))], output_xlsx_filepath)
 
 
 def main():
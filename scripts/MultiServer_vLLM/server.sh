@@ -104,6 +104,7 @@ fi
 
 # Locust settings
 DURATION=3m # 3 minutes
+WARMUP=30s # Requests sent in the first 30s (graph capture, cold KV cache) are excluded from the metrics
 I_FOLDER=$USER/POC_RFP/vllm/Llama3.1/Datasets
 N_USER=(1 8 16 24 32 40 48 56 64 96 128 196)
 I_FILE=(2000.txt 4400.txt 8600.txt)
@@ -196,7 +197,7 @@ for n_user in "${N_USER[@]}"; do
             # Start locust in the background and save the PID
             locust --server vLLM --hf-model $MODEL_PATH \
                 -f $Locust_File --host http://localhost:${server_port} --endpoint /v1/completions \
-                -t $DURATION -u $n_user -r $n_user --processes 16 \
+                -t $DURATION -u $n_user -r $n_user --processes 16 --warmup $WARMUP \
                 -ifile $I_FOLDER/$i_file -olen $o_len \
                 -outJson ${benchmark_folder}/server${idx_server}.json -target $target \
                 --master-host $Master_Host --master-port $Master_Port --master-bind-port $Master_Port \
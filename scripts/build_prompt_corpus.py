@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from transformers import AutoTokenizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.corpus import write_corpus_chunks
+
+# Build the random-token prompt corpus of vLLM0424/locustfile_RandomDataset.py once, instead of every
+# locust user loading the tokenizer and decoding its own prompts at ramp-up.
+
+
+def BuildRandomPrompts(tokenizer, n_prompt, ilen, seed, chunk_size):
+    """Yield (prompts, token_lens) of chunk_size prompts at a time. The same seed gives the same corpus
+    for every chunk size."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_prompt, chunk_size):
+        token_ids_batch = rng.integers(0, tokenizer.vocab_size, (min(chunk_size, n_prompt - start), ilen),
+                                       dtype=np.int32)
+        prompts = tokenizer.batch_decode(token_ids_batch, skip_special_tokens=True)
+        # Decoding random ids doesn't round-trip exactly, keep the real length for the report
+        token_lens = [len(ids) for ids in tokenizer(prompts, add_special_tokens=False)["input_ids"]]
+        yield prompts, token_lens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped prompt corpus for the locust workers.")
+    parser.add_argument("--model", type=str, default=os.getenv("MODEL_PATH"), help="Use the tokenizer of this model")
+    parser.add_argument("--len", type=int, required=True, help="Number of random tokens per prompt")
+    parser.add_argument("--num-prompts", type=int, default=100000,
+                        help="Corpus size. Every user reads 200 consecutive prompts from a random start")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=2000,
+                        help="Prompts generated and decoded at a time, bounds the memory at long --len")
+    parser.add_argument("--out", type=str, required=True, help="Output file, e.g. Datasets/random_2000.corpus")
+    args = parser.parse_args()
+
+    t_start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    n_token = []
+    def Chunks():
+        for prompts, token_lens in BuildRandomPrompts(tokenizer, args.num_prompts, args.len, args.seed,
+                                                      args.chunk_size):
+            n_token.extend(token_lens)
+            print(f"{len(n_token)}/{args.num_prompts} prompts", flush=True)
+            yield prompts, token_lens
+    meta = {"Model": args.model, "Len": args.len, "Seed": args.seed, "Source": "random"}
+    write_corpus_chunks(args.out, Chunks(), meta)
+    print(f"Saved {len(n_token)} prompts (mean {np.mean(n_token):.1f} tokens) to {args.out} "
+          f"in {time.perf_counter() - t_start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
+
+'''
+python build_prompt_corpus.py --model $MODEL_PATH --len 2000 --out ../Datasets/random_2000.corpus
+
+locust -f vLLM0424/locustfile_RandomDataset.py ... -ifile Datasets/2000.txt --corpus Datasets/random_2000.corpus
+'''
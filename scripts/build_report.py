@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.results_table import concat, load_benchmark_serving_logs, load_locust_results, pivot, write_tables
+
+
+def LoadTable(paths):
+    """Locust result stores (.jsonl/.json) and folders of benchmark_serving logs as one table"""
+    stores, tables = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            tables.append(load_benchmark_serving_logs(path))
+        else:
+            stores.append(path)
+    if stores:
+        tables.append(load_locust_results(stores))
+    return concat(tables)
+
+
+def BuildReport(paths, metrics, index, columns, output):
+    table = LoadTable(paths)
+    if table.empty:
+        print("No results found")
+        return
+    # One table per server and model
+    tables = [(f"{model}_{server}", pivot(data, metrics, index, columns))
+              for (server, model), data in table.groupby(level=["server", "model"], sort=True)]
+    write_tables(tables, output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pivot any metrics of the test results into .xlsx, .csv or .parquet.")
+    parser.add_argument("paths", nargs="+", help="Locust result stores (.jsonl or .json) or folders of benchmark_serving logs")
+    parser.add_argument("-m", "--metrics", nargs="+", default=["#Req", "E2E", "TTFT", "TPOT"], help="Metrics of every column group")
+    parser.add_argument("--index", default="users", help="Dimension of the rows")
+    parser.add_argument("--columns", nargs="*", default=None, help="Dimensions of the column groups. Default: the ones that vary")
+    parser.add_argument("-o", "--output", required=True, help="Output file, .xlsx, .csv or .parquet")
+    args = parser.parse_args()
+    BuildReport(args.paths, args.metrics, args.index, args.columns, args.output)
+
+'''
+python build_report.py MultiServer_vLLM/8B_BF16_8xTP1/benchmark/*.jsonl -m E2E TTFT OutputTok/s -o 8B_BF16_8xTP1.xlsx
+python build_report.py ../vLLM0424/Result/0516/DiffSeed/Llama-3.1-8B/ -m "Mean TTFT (ms)" "Output token throughput (tok/s)" -o Llama-3.1-8B.parquet
+'''
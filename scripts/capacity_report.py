@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+import pandas as pd
+from harness.capacity import fit_usl, parse_layout, slo_capacity, usl_peak
+from harness.report import merge_server_results
+from harness.results_table import locust_records, parse_test_case, store_files, store_folder, write_tables
+
+
+def LoadCurves(folder, throughput, latency_metrics):
+    """{case: [point]} of one layout folder. A case is a test case without its #User, e.g. "ilen=2000"."""
+    folder_stores = store_folder(folder)
+    if folder_stores is None:
+        return {}
+    cases = {}
+    for path in store_files(folder_stores):
+        for record in locust_records(path):
+            cases.setdefault(record["test_case"], []).append(record)
+
+    curves = {}
+    for test_case, results in cases.items():
+        dims = parse_test_case(test_case)
+        merged = merge_server_results(results)
+        if "users" not in dims or throughput not in merged:
+            print(f"Skip {folder}/{test_case}: no #User or {throughput}")
+            continue
+        case = " ".join(f"{dim}={value}" for dim, value in dims.items() if dim not in ("users", "dur"))
+        point = {"users": dims["users"], "throughput": merged[throughput]}
+        point.update({metric: merged.get(metric) for metric in latency_metrics})
+        curves.setdefault(case, []).append(point)
+    return curves
+
+
+def Analyze(root, throughput, limits, gpus_per_node):
+    rows = []
+    for folder in sorted(os.listdir(root)):
+        path = os.path.join(root, folder)
+        if not os.path.isdir(path) or folder == "excel":
+            continue
+        model, n_instance, tp = parse_layout(folder)
+        n_gpu = n_instance * (tp or 1)
+        for case, points in LoadCurves(path, throughput, list(limits)).items():
+            points.sort(key=lambda point: point["users"])
+            users, slo_throughput = slo_capacity(points, limits)
+            peak = max(points, key=lambda point: point["throughput"])
+            usl = fit_usl([(point["users"], point["throughput"] / n_instance) for point in points])
+            rows.append({
+                "Model": model, "Case": case, "Layout": f"{n_instance}xTP{tp}" if tp else folder, "#GPU": n_gpu,
+                "MaxUsers/server@SLO": users, "MaxConcurrency@SLO": users * n_instance,
+                f"{throughput}@SLO": slo_throughput, f"{throughput}/GPU@SLO": slo_throughput / n_gpu,
+                f"{throughput}/Node@SLO": slo_throughput / n_gpu * gpus_per_node,
+                f"Peak{throughput}": peak["throughput"], "PeakUsers/server": peak["users"],
+                "USL_sigma": usl[1] if usl else None, "USL_kappa": usl[2] if usl else None,
+                "KneeUsers/server": usl_peak(usl[1], usl[2]) if usl else None,
+            })
+    return pd.DataFrame(rows)
+
+
+def Recommend(table, throughput, gpus_per_node):
+    """Mark the layout with the most throughput per node under the SLO for every model and case."""
+    per_node = f"{throughput}/Node@SLO"
+    table["Best"] = table[per_node] == table.groupby(["Model", "Case"])[per_node].transform("max")
+    for (model, case), group in table[table["Best"]].groupby(["Model", "Case"]):
+        best = group.iloc[0]
+        if best[per_node] <= 0:
+            print(f"{model} {case}: no layout meets the SLO")
+            continue
+        print(f"{model} {case}: {best['Layout']} -> {best[per_node]:.1f} {throughput} per {gpus_per_node}-GPU node "
+              f"at {best['MaxConcurrency@SLO']:.1f} concurrent users")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Capacity under an SLO and saturation point of every TPxInstances layout of a MultiServer sweep.")
+    parser.add_argument("-r", type=str, required=True, help="The root folder, one sub folder per layout, e.g. NoPrefix_Llama-3.1-8B_4xTP2")
+    parser.add_argument("--slo-ttft-ms", type=float, default=None, help="TTFT limit (ms)")
+    parser.add_argument("--slo-tpot-ms", type=float, default=None, help="TPOT limit (ms)")
+    parser.add_argument("--percentile", type=str, default="P99", help="Latency the SLO applies to, e.g. P90, P99, or 'mean'")
+    parser.add_argument("--throughput", type=str, default="OutputTok/s", help="Throughput metric of the results")
+    parser.add_argument("--gpus-per-node", type=int, default=8)
+    parser.add_argument("-o", type=str, default=None, help="Output file, .xlsx, .csv or .parquet. Default: <root>/excel/capacity.xlsx")
+    args = parser.parse_args()
+
+    suffix = "" if args.percentile == "mean" else f"_{args.percentile}"
+    # The results are in seconds
+    limits = {f"{metric}{suffix}": limit / 1000 for metric, limit in
+              (("TTFT", args.slo_ttft_ms), ("TPOT", args.slo_tpot_ms)) if limit is not None}
+    table = Analyze(args.r, args.throughput, limits, args.gpus_per_node)
+    if table.empty:
+        print(f"No sweep results under {args.r}")
+        sys.exit(1)
+    table = Recommend(table, args.throughput, args.gpus_per_node)
+
+    output = args.o or os.path.join(args.r, "excel", "capacity.xlsx")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    write_tables([(f"SLO {limits or 'none'}", table.set_index(["Model", "Case", "Layout"]).sort_index())], output)
+
+'''
+python capacity_report.py -r MultiServer_vLLM --slo-ttft-ms 2000 --slo-tpot-ms 50
+python capacity_report.py -r MultiServer_vLLM --slo-ttft-ms 1000 --percentile mean --gpus-per-node 8 -o capacity.csv
+'''
@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+import pandas as pd
+from harness.regression import compare_case
+from harness.report import merge_server_results
+from harness.results_table import benchmark_serving_records, locust_records, store_files, write_tables
+
+# Locust results and benchmark_serving logs
+METRICS = ["TTFT", "TPOT", "E2E", "TTFT_P99", "OutputTok/s", "Goodput(req/s)",
+           "Output token throughput (tok/s)", "Mean TTFT (ms)", "P99 TTFT (ms)", "Mean TPOT (ms)", "Mean E2EL (ms)"]
+# A regression of these fails the comparison
+GATE = ["TTFT", "OutputTok/s", "Output token throughput (tok/s)", "Mean TTFT (ms)"]
+
+
+def LoadResultSet(path):
+    """{test_case: result} of a results store, a folder of stores or a folder of benchmark_serving results/logs.
+    The servers of a test case are merged into one result."""
+    if os.path.isdir(path):
+        records = list(benchmark_serving_records(path))
+        for store in store_files(path):
+            records += locust_records(store)
+    else:
+        records = list(locust_records(path))
+    cases = {}
+    for record in records:
+        cases.setdefault(record["test_case"], []).append(record)
+    return {test_case: results[0] if len(results) == 1 else merge_server_results(results)
+            for test_case, results in cases.items()}
+
+
+def Compare(base_path, paths, metrics, gate, threshold, alpha, output):
+    base = LoadResultSet(base_path)
+    tables, n_regression = [], 0
+    for path in paths:
+        other = LoadResultSet(path)
+        common = [test_case for test_case in base if test_case in other]
+        missing = sorted(set(base) ^ set(other))
+        if missing:
+            print(f"{len(missing)} test cases are only in one of {base_path} and {path}: {' '.join(missing)}")
+        rows = [{"TestCase": test_case, **row} for test_case in common
+                for row in compare_case(base[test_case], other[test_case], metrics, threshold, alpha)]
+        if not rows:
+            print(f"Nothing to compare between {base_path} and {path}")
+            continue
+        table = pd.DataFrame(rows).set_index(["TestCase", "Metric"])
+        print(f"\n{base_path} -> {path}")
+        print(table.to_string(float_format=lambda value: f"{value:.4g}"))
+        failed = table[(table["Status"] == "regression") & table.index.get_level_values("Metric").isin(gate)]
+        n_regression += len(failed)
+        for (test_case, metric), row in failed.iterrows():
+            print(f"REGRESSION {test_case} {metric}: {row['Base']:.4g} -> {row['New']:.4g} ({row['Delta(%)']:+.1f}%)")
+        tables.append((f"{base_path} -> {path}", table))
+    if output and tables:
+        write_tables(tables, output)
+    return n_regression
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare result sets of the same test cases against a baseline.")
+    parser.add_argument("base", help="Baseline: a results store (.jsonl/.json) or a folder of stores or benchmark_serving logs")
+    parser.add_argument("new", nargs="+", help="Result sets to compare with the baseline")
+    parser.add_argument("-m", "--metrics", nargs="+", default=METRICS, help="Metrics to compare")
+    parser.add_argument("--gate", nargs="+", default=GATE, help="Metrics whose regression fails the comparison")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Change (%%) in the bad direction that is a regression")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level when per-request statistics exist")
+    parser.add_argument("-o", "--output", default=None, help="Also save the comparison to .xlsx, .csv or .parquet")
+    args = parser.parse_args()
+
+    n_regression = Compare(args.base, args.new, args.metrics, args.gate, args.threshold, args.alpha, args.output)
+    if n_regression:
+        print(f"\n{n_regression} regressions above {args.threshold}%")
+        sys.exit(1)
+    print("\nNo regression")
+
+'''
+python compare_results.py ../vLLM0424/Result_New/Llama-3.3-70B-Instruct-FP8-KV_BT131072_V0/metric.json \
+    ../vLLM0424/Result_New/Llama-3.3-70B-Instruct-FP8-KV_BT131072_V1/metric.json --threshold 3
+python compare_results.py ../vLLM0424/Result/0528/V0_Hit0/Llama-3.1-8B ../vLLM0424/Result/0528/V1_Hit0/Llama-3.1-8B -o V0_V1.xlsx
+'''
@@ -0,0 +1,106 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+from transformers import AutoTokenizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.corpus import write_corpus
+
+# Compile N distinct prompts per input length into <out-folder>/<len>.corpus (see harness/corpus.py).
+# generate_datasets.py writes a single <len>.txt, so with prefix caching every request after the first one
+# is a full cache hit. Here every prompt is
+#   shared prefix (--prefix-ratio of the tokens, identical in all prompts) + its own shuffle of the article lines
+# and is checked to encode to exactly `len` tokens (without special tokens).
+MAX_FIX = 8  # Rounds of length correction before a candidate is dropped
+
+
+def CountTokens(tokenizer, text):
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def ExactLengthText(tokenizer, prefix_text, suffix_ids, n_token):
+    """prefix_text + the decoded head of suffix_ids, encoding to exactly n_token tokens, or None."""
+    n_suffix = n_token - CountTokens(tokenizer, prefix_text)
+    for _ in range(MAX_FIX):
+        if n_suffix <= 0 or n_suffix > len(suffix_ids):
+            return None
+        # Token merges at the boundaries change the count after decode, so re-count and correct
+        text = prefix_text + tokenizer.decode(suffix_ids[:n_suffix], skip_special_tokens=True)
+        diff = n_token - CountTokens(tokenizer, text)
+        if diff == 0:
+            return text
+        n_suffix += diff
+    return None
+
+
+def CompileLength(tokenizer, lines, n_token, n_prompt, prefix_ratio, rng):
+    article = "\n".join(lines)
+    article_ids = tokenizer.encode(article, add_special_tokens=False)
+    repeat = math.ceil(2 * n_token / max(len(article_ids), 1))  # Enough text for any shuffle
+    lines = lines * repeat
+
+    n_prefix = int(n_token * prefix_ratio)
+    prefix_text = "Summarize the poem:\n"
+    if n_prefix > 0:
+        prefix_ids = tokenizer.encode("\n".join(lines), add_special_tokens=False)[:n_prefix]
+        prefix_text += tokenizer.decode(prefix_ids, skip_special_tokens=True) + "\n"
+
+    prompts, seen, n_reject = [], set(), 0
+    while len(prompts) < n_prompt:
+        shuffled = lines[:]
+        rng.shuffle(shuffled)
+        suffix_ids = tokenizer.encode("\n".join(shuffled), add_special_tokens=False)
+        text = ExactLengthText(tokenizer, prefix_text, suffix_ids, n_token)
+        if text is None or text in seen:
+            n_reject += 1
+            if n_reject > 10 * n_prompt + 100:
+                raise RuntimeError(f"Can't build {n_prompt} distinct prompts of {n_token} tokens. "
+                                   f"Got {len(prompts)}, try a longer article or a smaller --prefix-ratio")
+            continue
+        seen.add(text)
+        prompts.append(text)
+    return prompts, n_reject
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile distinct prompts of exact token lengths.")
+    parser.add_argument("--model", type=str, default=os.getenv("MODEL_PATH"), help="Use the tokenizer of this model")
+    parser.add_argument("--article-path", type=str, required=True, help="Source text, e.g. sonnet.txt")
+    parser.add_argument("--len", type=int, nargs="+", required=True, help="Token lengths, e.g. 2000 4000 8500")
+    parser.add_argument("--num-prompts", type=int, default=1000, help="Distinct prompts per length")
+    parser.add_argument("--prefix-ratio", type=float, default=0.0,
+                        help="Fraction of every prompt that is the same in all prompts of a length (0 <= r < 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-folder", type=str, required=True)
+    args = parser.parse_args()
+    assert 0 <= args.prefix_ratio < 1, "--prefix-ratio must be in [0, 1)"
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, legacy=True)
+    with open(args.article_path, 'r') as file:
+        lines = [line for line in file.read().splitlines() if line.strip()]
+
+    for n_token in args.len:
+        t_start = time.perf_counter()
+        rng = random.Random(args.seed + n_token)
+        prompts, n_reject = CompileLength(tokenizer, lines, n_token, args.num_prompts, args.prefix_ratio, rng)
+        meta = {"Model": args.model, "Len": n_token, "Seed": args.seed, "PrefixRatio": args.prefix_ratio,
+                "Source": os.path.basename(args.article_path)}
+        out_file = os.path.join(args.out_folder, f"{n_token}.corpus")
+        write_corpus(out_file, prompts, [n_token] * len(prompts), meta)
+        print(f"Saved {len(prompts)} prompts of {n_token} tokens to {out_file} "
+              f"({n_reject} rejected, {time.perf_counter() - t_start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
+
+'''
+python compile_prompt_set.py \
+    --model /data/huggingface/hub/meta-llama/Llama-3.1-70B \
+    --article-path /app/vllm/benchmarks/sonnet.txt --len 2000 4000 8500 \
+    --num-prompts 1000 --prefix-ratio 0.5 --out-folder ../Datasets
+'''
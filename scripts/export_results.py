@@ -0,0 +1,39 @@
+import argparse
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.results_store import compact, load_nested, write_json_atomic
+
+# Export the append-only results (*.jsonl) written by the clients to the nested outJson layout
+# [server][model_name][test_case] read by GenerateExcel_MultiServer.py
+
+
+def Export(jsonl_file, compact_log):
+    if compact_log:
+        n_record = compact(jsonl_file)
+        print(f"Compacted {jsonl_file} to {n_record} records")
+    json_file = os.path.splitext(jsonl_file)[0] + ".json"
+    write_json_atomic(json_file, load_nested(jsonl_file))
+    print(f"Export {jsonl_file} -> {json_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the .jsonl results store to the nested .json files.")
+    parser.add_argument("paths", nargs="+", help=".jsonl files, or folders searched recursively for them")
+    parser.add_argument("--compact", action="store_true", help="Also drop the overwritten records from the .jsonl")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "**", "*.jsonl"), recursive=True))
+        else:
+            files = [path]
+        for jsonl_file in files:
+            Export(jsonl_file, args.compact)
+
+'''
+python export_results.py MultiServer_vLLM
+python export_results.py MultiServer_vLLM/8B_BF16_8xTP1/benchmark/server0.jsonl --compact
+'''
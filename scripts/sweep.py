@@ -0,0 +1,338 @@
+import argparse
+import itertools
+import json
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+import tomllib
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.prometheus import MetricSeries, format_exposition, parse_exposition
+
+# Run a benchmark sweep from a declarative TOML spec (see sweeps/*.toml) instead of the nested bash loops
+# of MultiServer_*/server.sh and run_benchmark_serving.sh.
+#   - Every server config (model, TP, instances, ...) starts its instances as subprocesses in their own
+#     process group, waits for the health endpoint with backoff and is stopped by killing that group.
+#   - All cases of a config run on the same servers (restart = "case" brings back a restart per case).
+#     Between cases the servers are drained and their prefix cache is flushed, and the /metrics dump of a
+#     case is the difference of the scrapes before and after it, so it reads like a fresh server's.
+#   - The clients of the instances run concurrently, one per server.
+# Commands are templates: {name} is replaced by the [vars], the server config, the instance and the case.
+# A case has the [client] users, lengths and extra axes, and the [client.derived] values computed from them.
+
+
+def Format(template, values):
+    return template.format(**values) if isinstance(template, str) else template
+
+
+def HttpGet(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def HttpPost(url, timeout=30):
+    with urllib.request.urlopen(urllib.request.Request(url, method="POST"), timeout=timeout) as response:
+        return response.status, response.read()
+
+
+class ServerGroup:
+    """The instances of one server config."""
+
+    def __init__(self, spec, values):
+        self.spec = spec
+        self.values = values
+        self.instances = []  # (values of the instance, Popen)
+
+    def InstanceValues(self):
+        n_gpu_per_instance = self.values["gpus"] // self.values["instances"]
+        if self.values["tp"] > n_gpu_per_instance:
+            raise ValueError(f"TP{self.values['tp']} x {self.values['instances']} instances needs more than "
+                             f"{self.values['gpus']} GPUs")
+        for idx in range(self.values["instances"]):
+            gpu_ids = range(idx * n_gpu_per_instance, idx * n_gpu_per_instance + self.values["tp"])
+            yield self.values | {
+                "idx": idx,
+                "port": self.values["base_port"] + idx * self.values["port_stride"] + 1,
+                "master_host": f"127.0.1.{idx + 1}",
+                "master_port": 5001 + idx,
+                "gpu_ids": ",".join(str(i) for i in gpu_ids),
+            }
+
+    def Start(self, dry_run=False):
+        server = self.spec["server"]
+        for values in self.InstanceValues():
+            cmd = Format(server["command"], values)
+            print(f"[server{values['idx']}] {' '.join(cmd.split())}", flush=True)
+            if dry_run:
+                self.instances.append((values, None))
+                continue
+            env = os.environ | {"CUDA_VISIBLE_DEVICES": values["gpu_ids"], "HIP_VISIBLE_DEVICES": values["gpu_ids"]}
+            env |= {k: Format(str(v), values) for k, v in server.get("env", {}).items()}
+            # The server keeps its own copy of the log file descriptor
+            with open(os.path.join(values["log_folder"], f"server{values['idx']}.log"), "ab") as log:
+                proc = subprocess.Popen(shlex.split(cmd), env=env, stdout=log, stderr=subprocess.STDOUT,
+                                        start_new_session=True)  # Own process group, so Stop() gets the workers too
+            self.instances.append((values, proc))
+        if not dry_run:
+            self.WaitReady()
+
+    def WaitReady(self):
+        timeout = self.spec.get("startup_timeout", 3600)
+        t_start = time.perf_counter()
+        for values, proc in self.instances:
+            url = f"http://localhost:{values['port']}{self.spec.get('health', '/health')}"
+            delay = 1
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"Server {values['idx']} exited with {proc.returncode}. "
+                                       f"See {values['log_folder']}/server{values['idx']}.log")
+                try:
+                    if HttpGet(url)[0] == 200:
+                        break
+                except OSError:
+                    pass
+                if time.perf_counter() - t_start > timeout:
+                    raise TimeoutError(f"{url} is not ready after {timeout}s")
+                time.sleep(delay)
+                delay = min(delay * 1.5, 15)
+            print(f"Server on port {values['port']} is ready after {time.perf_counter() - t_start:.0f}s", flush=True)
+
+    def MetricsUrl(self, values):
+        return Format(self.spec.get("metrics", "http://localhost:{port}/metrics"), values)
+
+    def Scrape(self, values):
+        try:
+            return HttpGet(self.MetricsUrl(values))[1].decode()
+        except OSError as e:
+            print(f"WARNING: Can't read /metrics of server {values['idx']}: {e}")
+            return None
+
+    def Drain(self, values):
+        """Wait until the previous case's requests (e.g. cancelled by locust -t) left the server."""
+        timeout = self.spec.get("drain_timeout", 300)
+        t_start = time.perf_counter()
+        while time.perf_counter() - t_start < timeout:
+            text = self.Scrape(values)
+            if text is None:
+                return
+            _, samples = parse_exposition(text)
+            busy = sum(v for (name, _), v in samples.items() if name in self.spec.get(
+                "busy_metrics", ["vllm:num_requests_running", "vllm:num_requests_waiting"]))
+            if busy == 0:
+                return
+            time.sleep(1)
+        print(f"WARNING: Server {values['idx']} still busy after {timeout}s")
+
+    def Reset(self):
+        """Bring the running servers back to the state of a fresh start. Return their /metrics series,
+        starting with the baseline scrape."""
+        series = []
+        for values, _ in self.instances:
+            self.Drain(values)
+            if "reset_prefix_cache" in self.spec:
+                # vLLM only serves /reset_prefix_cache with VLLM_SERVER_DEV_MODE=1
+                url = Format(self.spec["reset_prefix_cache"], values)
+                try:
+                    HttpPost(url)
+                except OSError as e:
+                    print(f"WARNING: {url} failed: {e}")
+            series.append(MetricSeries())
+            self.ScrapeInto(values, series[-1])
+        return series
+
+    def ScrapeInto(self, values, series):
+        text = self.Scrape(values)
+        if text is not None:
+            series.add(time.time(), text)
+
+    def ScrapeEvery(self, interval, series, stop):
+        # Background scrapes during a case, for the per-interval rates
+        while not stop.wait(interval):
+            for (values, _), s in zip(self.instances, series):
+                self.ScrapeInto(values, s)
+
+    def Warmup(self, dry_run=False):
+        """Run the client's warm-up command against every fresh instance, e.g. the longest prompts once."""
+        client = self.spec["client"]
+        if "warmup" not in client:
+            return
+        for values, _ in self.instances:
+            cmd = Format(client["warmup"], values)
+            print(f"[warmup{values['idx']}] {' '.join(cmd.split())}", flush=True)
+            if dry_run:
+                continue
+            with open(os.path.join(values["log_folder"], f"warmup_client{values['idx']}.log"), "ab") as log:
+                if subprocess.run(shlex.split(cmd), stdout=log, stderr=subprocess.STDOUT).returncode != 0:
+                    print(f"WARNING: warm-up of server {values['idx']} failed")
+
+    def Stop(self):
+        server = self.spec["server"]
+        for values, proc in self.instances:
+            if "stop_command" in server:
+                subprocess.run(shlex.split(Format(server["stop_command"], values)))
+            if proc is None or proc.poll() is not None:
+                continue
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+        self.instances = []
+
+
+def StopClients(procs):
+    for _, proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for _, proc in procs:
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def RunCase(group, case, dry_run=False):
+    """Run the client of every instance concurrently and save the case's /metrics afterwards."""
+    client = group.spec["client"]
+    series = group.Reset() if not dry_run else []
+    procs = []
+    for values, _ in group.instances:
+        values = values | case
+        cmd = Format(client["command"], values)
+        print(f"[client{values['idx']}] {' '.join(cmd.split())}", flush=True)
+        if dry_run:
+            continue
+        log_path = Format(client.get("log", "{log_folder}/{test_case}_client{idx}.log"), values)
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        env = os.environ | {k: Format(str(v), values) for k, v in client.get("env", {}).items()}
+        with open(log_path, "wb") as log:
+            procs.append((values, subprocess.Popen(shlex.split(cmd), env=env, stdout=log, stderr=subprocess.STDOUT)))
+
+    stop = threading.Event()
+    scraper = None
+    if procs and group.spec.get("scrape_interval", 0) > 0:
+        scraper = threading.Thread(target=group.ScrapeEvery, args=(group.spec["scrape_interval"], series, stop),
+                                   daemon=True)
+        scraper.start()
+    try:
+        for values, proc in procs:
+            if proc.wait() != 0:
+                print(f"WARNING: client {values['idx']} of {case['test_case']} exited with {proc.returncode}")
+    finally:
+        # On an error or Ctrl-C, don't leave the clients running against servers that are stopped next
+        StopClients(procs)
+        stop.set()
+        if scraper is not None:
+            scraper.join()
+    if not client.get("dump_metrics", True):
+        return
+
+    for (values, _), s in zip(procs, series):
+        group.ScrapeInto(values, s)
+        if not s.times:
+            continue
+        name = os.path.join(values["openai_metric_folder"], f"{case['test_case']}_server{values['idx']}")
+        # Same text format as a scrape of a fresh server, for GenerateExcel_OpenAI.py
+        samples = s.delta() if len(s.times) > 1 else s.snapshot(-1)
+        with open(name + ".log", "w") as f:
+            f.write(format_exposition(s.types, samples))
+        # Every scrape, column-wise, and the per-case deltas / histogram percentiles
+        with open(name + "_metrics.json", "w") as f:
+            json.dump(s.to_dict() | {"Summary": s.summary()}, f)
+
+def Evaluate(expression):
+    # Arithmetic of a [client.derived] value, e.g. "4 * 10". The spec is a local file of the user running it
+    return eval(expression, {"__builtins__": {}})
+
+
+def Cases(spec):
+    client = spec["client"]
+    duration = client.get("duration", "")
+    axes = client.get("axes", {})
+    case_idx = 0
+    # Same order as the shell loops: extra axes (e.g. hit_rate) outermost, then users, lengths inner
+    for axis_values in itertools.product(*axes.values()):
+        for n_user, length in itertools.product(client["users"], client["lengths"]):
+            ilen = os.path.splitext(os.path.basename(str(length.get("ifile", length.get("ilen")))))[0]
+            n_user_str = "{:02d}user".format(n_user)
+            case = dict(zip(axes, axis_values)) | length | {
+                "n_user": n_user, "n_user_str": n_user_str, "ilen": ilen, "duration": duration, "case_idx": case_idx}
+            for name, expression in client.get("derived", {}).items():
+                case[name] = Evaluate(Format(expression, case))
+            case["test_case"] = Format(client.get("test_case", "{duration}_i{ilen}_{n_user_str}"), case)
+            case_idx += 1
+            yield case
+
+
+def ConfigValues(spec, config, dry_run=False):
+    values = {"gpus": 8, "base_port": 8000, "port_stride": 1} | spec.get("vars", {}) | config
+    model = values["model"]
+    values["model_path"] = os.path.join(values.get("model_folder", ""), model)
+    values["model_tag"] = model.replace("/", "_")
+    values["model_name"] = os.path.basename(model)
+    values["result_root"] = spec.get("result_root", ".")
+    values["result_folder_name"] = Format(spec.get("result_folder", "{model_tag}_{instances}xTP{tp}"), values)
+    result_folder = os.path.join(spec.get("result_root", "."), values["result_folder_name"])
+    values |= {
+        "result_folder": result_folder,
+        "log_folder": os.path.join(result_folder, "log"),
+        "benchmark_folder": os.path.join(result_folder, "LocustMetric"),
+        "openai_metric_folder": os.path.join(result_folder, "OpenAI_Metric"),
+    }
+    for key in ("log_folder", "benchmark_folder", "openai_metric_folder"):
+        if not dry_run:
+            os.makedirs(values[key], exist_ok=True)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a benchmark sweep from a TOML spec.")
+    parser.add_argument("spec", type=str, help="Sweep spec, e.g. sweeps/multiserver_vllm.toml")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the commands")
+    args = parser.parse_args()
+
+    with open(args.spec, "rb") as f:
+        spec = tomllib.load(f)
+    restart_per_case = spec.get("restart", "config") == "case"
+
+    # One-off preparation, e.g. installing the benchmark_dataset.py that benchmark_serving.py imports
+    setup_values = {"repo": os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")} | spec.get("vars", {})
+    for command in spec.get("setup", []):
+        cmd = Format(command, setup_values)
+        print(f"[setup] {cmd}", flush=True)
+        if not args.dry_run:
+            subprocess.run(shlex.split(cmd), check=True)
+
+    t_sweep = time.perf_counter()
+    for config in spec["server"]["configs"]:
+        group = ServerGroup(spec, ConfigValues(spec, config, args.dry_run))
+        print(f"===== {group.values['result_folder_name']} =====", flush=True)
+        try:
+            for case in Cases(spec):
+                if not group.instances:
+                    group.Start(args.dry_run)
+                    group.Warmup(args.dry_run)
+                t_case = time.perf_counter()
+                RunCase(group, case, args.dry_run)
+                print(f"{case['test_case']} done in {time.perf_counter() - t_case:.0f}s", flush=True)
+                if restart_per_case:
+                    group.Stop()
+        finally:
+            group.Stop()
+    print(f"Sweep done in {(time.perf_counter() - t_sweep) / 60:.1f} min")
+
+
+if __name__ == "__main__":
+    main()
+
+'''
+python sweep.py sweeps/multiserver_vllm.toml --dry-run
+python sweep.py sweeps/multiserver_vllm.toml 2>&1 | tee sweep.log
+'''
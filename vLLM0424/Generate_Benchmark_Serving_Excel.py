@@ -1,48 +1,31 @@
 import argparse
-import json
 import os
 import sys
-import pandas as pd
-import csv  # Import the csv module
-import os
 
-ILEN=["i2000", "i4000", "i8500"] # Note: edit the sizes
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For the harness package
+from harness.results_table import load_benchmark_serving_logs, pivot, write_tables
 
-def FillInCsvHeader(concurrency_list, folder, csv_writer):
-    csv_writer.writerow([folder])
-    header = ["#Concur"]
-    for ilen in ILEN:
-        header.extend([f"{ilen}_TPUT(tok/s)", f"{ilen}_TTFT(ms)", f"{ilen}_TPOT(ms)", f"{ilen}_E2E(ms)"])
-    csv_writer.writerow(header)
+# benchmark_serving metric -> column title. The concurrencies and ilen/olen come from the result names
+METRICS = {
+    "Output token throughput (tok/s)": "TPUT(tok/s)",
+    "Mean TTFT (ms)": "TTFT(ms)",
+    "Mean TPOT (ms)": "TPOT(ms)",
+    "Mean E2EL (ms)": "E2E(ms)",
+}
 
 def ProcessData(args):
-    output_filename = args.o
-    concurrency_list = [1, 2, 4, 6, 8, 10, 12, 14, 16]
-    folder = args.folder
-
-    with open(output_filename, 'w', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        FillInCsvHeader(concurrency_list, folder, csv_writer)
-
-        for concur in concurrency_list:
-            row_data = [concur]
-            num_prompts = concur*20
-            for ilen in ILEN:
-                benchamrk_log = os.path.join(folder, f"{ilen}_o{200}_c{concur}_p{num_prompts}.log")
-                with open(benchamrk_log, 'r') as file:
-                    tput, ttft, tpot, e2el = 'None', 'None', 'None', 'None'
-                    for line in file:
-                        if "Output token throughput (tok/s):" in line:
-                            tput = float(line.split("Output token throughput (tok/s):")[-1].strip())
-                        elif "Mean TTFT (ms):" in line:
-                            ttft = float(line.split("Mean TTFT (ms):")[-1].strip()) 
-                        elif "Mean TPOT (ms):" in line:
-                            tpot = float(line.split("Mean TPOT (ms):")[-1].strip()) 
-                        elif "Mean E2EL (ms):" in line:
-                            e2el= float(line.split("Mean E2EL (ms):")[-1].strip()) 
-                row_data.extend([tput, ttft, tpot, e2el])       
-            csv_writer.writerow(row_data)
-    print(f"Successfully save into {output_filename}")
+    # i2000_o200_c4_p80.serving.json (or .log) -> #Concur 4 in the rows, i2000 in the column groups.
+    # The percentiles need the per-request data of --save-detailed; cases without a result are left empty
+    table = load_benchmark_serving_logs(args.folder, percentiles=args.percentiles)
+    if table.empty:
+        print(f"No benchmark_serving results in {args.folder}")
+        return
+    metrics = dict(METRICS)
+    for name in ("TTFT", "TPOT", "E2EL"):
+        for q in args.percentiles:
+            metrics[f"P{q:g} {name} (ms)"] = f"{name.replace('E2EL', 'E2E')}_P{q:g}(ms)"
+    report = pivot(table, list(metrics)).rename(columns=metrics).rename_axis("#Concur")
+    write_tables([(args.folder, report)], args.o)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -56,9 +39,16 @@ if __name__ == "__main__":
     parser.add_argument(
         "--o",
         type=str,
-        help="out csv filename",
+        help="out filename, .csv, .xlsx or .parquet",
         default="result.csv"
     )
+    parser.add_argument(
+        "--percentiles",
+        type=float,
+        nargs="+",
+        help="Latency percentiles of the per-request results",
+        default=[50, 90, 99]
+    )
 
     args = parser.parse_args()
     ProcessData(args)
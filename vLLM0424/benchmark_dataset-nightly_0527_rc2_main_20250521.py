@@ -15,12 +15,16 @@ SampleRequest instances, similar to the approach used in ShareGPT.
 """
 
 import base64
+import hashlib
 import io
 import json
 import logging
+import os
 import random
+import struct
 from abc import ABC, abstractmethod
 from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from functools import cache
 from io import BytesIO
@@ -289,6 +293,11 @@ class RandomDataset(BenchmarkDataset):
     DEFAULT_RANGE_RATIO = 0.0
     DEFAULT_INPUT_LEN = 1024
     DEFAULT_OUTPUT_LEN = 128
+    # Prefix-cache workload. benchmark_serving.py has no flags for these, so
+    # they can also be set with the env vars RANDOM_PREFIX_HIT_RATE and
+    # RANDOM_HIT_PREFIX_LEN.
+    DEFAULT_PREFIX_HIT_RATE = None
+    DEFAULT_HIT_PREFIX_LEN = None
 
     def __init__(
         self,
@@ -304,13 +313,65 @@ class RandomDataset(BenchmarkDataset):
         range_ratio: float = DEFAULT_RANGE_RATIO,
         input_len: int = DEFAULT_INPUT_LEN,
         output_len: int = DEFAULT_OUTPUT_LEN,
+        prefix_hit_rate: Optional[float] = DEFAULT_PREFIX_HIT_RATE,
+        hit_prefix_len: Optional[int] = DEFAULT_HIT_PREFIX_LEN,
         **kwargs,
     ) -> list[SampleRequest]:
+        """
+        prefix_hit_rate (0-1): fraction of the (random part of the) prompt
+        tokens that a warm prefix cache can serve. A fraction
+        prefix_hit_rate * input_len / hit_prefix_len of the requests reuse the
+        first hit_prefix_len tokens of an earlier request; the others are new.
+        hit_prefix_len defaults to prefix_hit_rate * input_len, i.e. every
+        request after the first reuses a prefix. None keeps unique prompts.
+        """
+        if prefix_hit_rate is None and "RANDOM_PREFIX_HIT_RATE" in os.environ:
+            prefix_hit_rate = float(os.environ["RANDOM_PREFIX_HIT_RATE"])
+        if hit_prefix_len is None and "RANDOM_HIT_PREFIX_LEN" in os.environ:
+            hit_prefix_len = int(os.environ["RANDOM_HIT_PREFIX_LEN"])
         # Enforce range_ratio < 1
         assert range_ratio < 1.0, (
             "random_range_ratio must be < 1.0 to ensure a valid sampling range"
         )
 
+        # --dataset-path <len>.corpus: distinct prompts of exact length from
+        # scripts/compile_prompt_set.py instead of decoded random tokens.
+        if self.dataset_path is not None and self.dataset_path.endswith(".corpus"):
+            return self.sample_from_corpus(
+                num_requests, input_len, output_len, range_ratio
+            )
+
+        # The generated set only depends on these and the RNG state on entry
+        # (benchmark_serving.py seeds np.random with --seed).
+        cache_path = self.cache_path(
+            tokenizer,
+            num_requests=num_requests,
+            prefix_len=prefix_len,
+            range_ratio=range_ratio,
+            input_len=input_len,
+            output_len=output_len,
+            prefix_hit_rate=prefix_hit_rate,
+            hit_prefix_len=hit_prefix_len,
+        )
+        if cache_path is not None and os.path.exists(cache_path):
+            logger.info("Load the random dataset from %s", cache_path)
+            with open(cache_path) as f:
+                cached = json.load(f)
+            # Leave the RNG where generating the set would have, so later draws
+            # match an uncached run
+            name, keys, pos, has_gauss, cached_gauss = cached["rng_state"]
+            np.random.set_state(
+                (name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached_gauss)
+            )
+            return [
+                SampleRequest(
+                    prompt=prompt, prompt_len=prompt_len, expected_output_len=out_len
+                )
+                for prompt, prompt_len, out_len in zip(
+                    cached["prompt"], cached["prompt_len"], cached["output_len"]
+                )
+            ]
+
         vocab_size = tokenizer.vocab_size
         num_special_tokens = tokenizer.num_special_tokens_to_add()
         real_input_len = input_len - num_special_tokens
@@ -335,38 +396,238 @@ class RandomDataset(BenchmarkDataset):
         output_lens = np.random.randint(output_low, output_high + 1, size=num_requests)
         offsets = np.random.randint(0, vocab_size, size=num_requests)
 
-        requests = []
-        for i in range(num_requests):
-            # inner_seq = (
-            #     (offsets[i] + i + np.arange(input_lens[i])) % vocab_size
-            # ).tolist()
-            # [Jacob] Extreme case: the prompts are the same
-            inner_seq = ((0 + np.arange(input_lens[i])) % vocab_size).tolist()
-            token_sequence = prefix_token_ids + inner_seq
-            prompt = tokenizer.decode(token_sequence)
-            print(f"[DEBUG] id={i}, prompt[:10]={prompt[:20]}")
-            # After decoding the prompt we have to encode and decode it again.
-            # This is done because in some cases N consecutive tokens
-            # give a string tokenized into != N number of tokens.
-            # For example for GPT2Tokenizer:
-            # [6880, 6881] -> ['Ġcalls', 'here'] ->
-            # [1650, 939, 486] -> ['Ġcall', 'sh', 'ere']
-            # To avoid uncontrolled change of the prompt length,
-            # the encoded sequence is truncated before being decode again.
-            re_encoded_sequence = tokenizer.encode(prompt, add_special_tokens=False)[
-                : input_lens[i]
+        if prefix_hit_rate is not None:
+            inner_seqs = self.prefix_hit_sequences(
+                vocab_size, input_lens, prefix_hit_rate, hit_prefix_len
+            )
+        else:
+            inner_seqs = [
+                ((offsets[i] + i + np.arange(input_lens[i])) % vocab_size).tolist()
+                for i in range(num_requests)
             ]
-            prompt = tokenizer.decode(re_encoded_sequence)
-            total_input_len = prefix_len + int(input_lens[i])
-            requests.append(
-                SampleRequest(
-                    prompt=prompt,
-                    prompt_len=total_input_len,
-                    expected_output_len=int(output_lens[i]),
+        token_sequences = [prefix_token_ids + inner_seq for inner_seq in inner_seqs]
+        total_input_lens = (prefix_len + input_lens).tolist()
+
+        # Decode, re-encode and truncate the whole set with the batch API of the
+        # fast tokenizer, optionally spread over RANDOM_DATASET_WORKERS processes.
+        num_workers = int(os.environ.get("RANDOM_DATASET_WORKERS", 0))
+        if num_workers > 1 and num_requests >= 2 * num_workers:
+            chunk = -(-num_requests // num_workers)
+            with ProcessPoolExecutor(
+                num_workers,
+                initializer=_init_decode_worker,
+                initargs=(tokenizer,),
+            ) as executor:
+                chunks = executor.map(
+                    _decode_exact_len_in_worker,
+                    [
+                        (token_sequences[k : k + chunk], total_input_lens[k : k + chunk])
+                        for k in range(0, num_requests, chunk)
+                    ],
                 )
+                prompts = [prompt for part in chunks for prompt in part]
+        else:
+            prompts = decode_exact_len(tokenizer, token_sequences, total_input_lens)
+
+        requests = [
+            SampleRequest(
+                prompt=prompts[i],
+                prompt_len=total_input_lens[i],
+                expected_output_len=int(output_lens[i]),
             )
+            for i in range(num_requests)
+        ]
+        if cache_path is not None:
+            name, keys, pos, has_gauss, cached_gauss = np.random.get_state()
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "prompt": prompts,
+                        "prompt_len": total_input_lens,
+                        "output_len": output_lens.tolist(),
+                        "rng_state": [
+                            name, keys.tolist(), pos, has_gauss, cached_gauss
+                        ],
+                    },
+                    f,
+                )
+            os.replace(tmp_path, cache_path)
         return requests
 
+    @staticmethod
+    def cache_path(tokenizer: PreTrainedTokenizerBase, **params) -> Optional[str]:
+        """
+        Cache file of a generated set under RANDOM_DATASET_CACHE, e.g.
+        ~/.cache/vllm_random_dataset. None without it, the cache is opt-in.
+        """
+        cache_dir = os.environ.get("RANDOM_DATASET_CACHE")
+        if not cache_dir:
+            return None
+        key = hashlib.sha256()
+        key.update(
+            json.dumps(
+                {
+                    "tokenizer": getattr(tokenizer, "name_or_path", ""),
+                    "tokenizer_class": type(tokenizer).__name__,
+                    "vocab_size": tokenizer.vocab_size,
+                    "format": 2,  # Files with the RNG state after the generation
+                    **params,
+                },
+                sort_keys=True,
+            ).encode()
+        )
+        # The seed: the whole state of the global numpy RNG
+        _, state_keys, state_pos, _, _ = np.random.get_state()
+        key.update(state_keys.tobytes())
+        key.update(str(state_pos).encode())
+        return os.path.join(cache_dir, f"random_{key.hexdigest()[:24]}.json")
+
+    @staticmethod
+    def prefix_hit_sequences(
+        vocab_size: int,
+        input_lens: np.ndarray,
+        prefix_hit_rate: float,
+        hit_prefix_len: Optional[int],
+    ) -> list[list[int]]:
+        assert 0.0 <= prefix_hit_rate <= 1.0, "prefix_hit_rate must be in [0, 1]"
+        num_requests = len(input_lens)
+        mean_len = float(np.mean(input_lens))
+        # Token hit rate = (fraction of hit requests) * hit_prefix_len / input_len.
+        # By default every request but the first is a hit.
+        if hit_prefix_len is None:
+            hit_prefix_len = int(round(prefix_hit_rate * mean_len))
+            hit_fraction = 1.0 if hit_prefix_len > 0 else 0.0
+        else:
+            hit_fraction = (
+                prefix_hit_rate * mean_len / hit_prefix_len if hit_prefix_len > 0 else 0.0
+            )
+        if hit_fraction > 1.0:
+            raise ValueError(
+                f"A hit prefix of {hit_prefix_len} tokens can't reach a "
+                f"{prefix_hit_rate:.0%} hit rate with {mean_len:.0f}-token prompts"
+            )
+        # The first request can't hit anything
+        n_hit = min(int(round(hit_fraction * num_requests)), num_requests - 1)
+        is_hit = np.zeros(num_requests, dtype=bool)
+        is_hit[1 + np.random.choice(num_requests - 1, size=n_hit, replace=False)] = True
+        logger.info(
+            "Prefix hit rate %.2f: %d/%d requests reuse a %d-token prefix",
+            prefix_hit_rate, n_hit, num_requests, hit_prefix_len,
+        )
+
+        # Every new request seeds a prefix group. Hit requests reuse the prefix
+        # of a random earlier group and get their own random suffix. With
+        # --random-range-ratio a prompt can be shorter than the prefix, then it
+        # is only the first input_len tokens of it.
+        groups = []
+        sequences = []
+        for i in range(num_requests):
+            if is_hit[i]:
+                prefix = groups[np.random.randint(len(groups))]
+            else:
+                prefix = np.random.randint(0, vocab_size, size=hit_prefix_len)
+                groups.append(prefix)
+            prefix = prefix[: input_lens[i]]
+            suffix = np.random.randint(
+                0, vocab_size, size=input_lens[i] - len(prefix)
+            )
+            sequences.append(np.concatenate([prefix, suffix]).tolist())
+        return sequences
+
+    def sample_from_corpus(
+        self,
+        num_requests: int,
+        input_len: int,
+        output_len: int,
+        range_ratio: float,
+    ) -> list[SampleRequest]:
+        prompts, token_lens, meta = read_prompt_corpus(self.dataset_path)
+        if meta.get("Len") != input_len:
+            logger.warning(
+                "Corpus %s has %s-token prompts, --random-input-len is %s",
+                self.dataset_path, meta.get("Len"), input_len,
+            )
+        # Distinct prompts as long as the corpus is big enough
+        indices = np.random.choice(
+            len(prompts), size=num_requests, replace=num_requests > len(prompts)
+        )
+        output_low = int(output_len * (1 - range_ratio))
+        output_high = int(output_len * (1 + range_ratio))
+        output_lens = np.random.randint(output_low, output_high + 1, size=num_requests)
+        return [
+            SampleRequest(
+                prompt=prompts[i],
+                prompt_len=int(token_lens[i]),
+                expected_output_len=int(output_lens[k]),
+            )
+            for k, i in enumerate(indices)
+        ]
+
+
+def decode_exact_len(
+    tokenizer: PreTrainedTokenizerBase,
+    token_sequences: list[list[int]],
+    input_lens: list[int],
+) -> list[str]:
+    """
+    Decode the token sequences to prompts of exactly input_lens tokens.
+    After decoding the prompt we have to encode and decode it again.
+    This is done because in some cases N consecutive tokens
+    give a string tokenized into != N number of tokens.
+    For example for GPT2Tokenizer:
+    [6880, 6881] -> ['Ġcalls', 'here'] ->
+    [1650, 939, 486] -> ['Ġcall', 'sh', 'ere']
+    To avoid uncontrolled change of the prompt length,
+    the encoded sequence is truncated before being decode again.
+    """
+    prompts = tokenizer.batch_decode(token_sequences)
+    re_encoded = tokenizer(prompts, add_special_tokens=False)["input_ids"]
+    return tokenizer.batch_decode(
+        [ids[:n] for ids, n in zip(re_encoded, input_lens)]
+    )
+
+
+_decode_worker_tokenizer = None
+
+
+def _init_decode_worker(tokenizer: PreTrainedTokenizerBase) -> None:
+    global _decode_worker_tokenizer
+    _decode_worker_tokenizer = tokenizer
+
+
+def _decode_exact_len_in_worker(args: tuple[list[list[int]], list[int]]) -> list[str]:
+    token_sequences, input_lens = args
+    return decode_exact_len(_decode_worker_tokenizer, token_sequences, input_lens)
+
+
+def read_prompt_corpus(path: str) -> tuple[list[str], list[int], dict]:
+    """
+    Read a prompt corpus written by InflightBatching's harness/corpus.py:
+    magic | n_prompt | meta_len | meta JSON | uint64 offsets[n_prompt + 1]
+    | uint32 token_lens[n_prompt] | UTF-8 blob (all little endian).
+    This file runs from the vLLM benchmarks folder, so it can't import the
+    harness package.
+    """
+    with open(path, "rb") as f:
+        buf = f.read()
+    magic, n_prompt, meta_len = struct.unpack_from("<8sQQ", buf, 0)
+    if magic != b"LLMCORP1":
+        raise ValueError(f"{path} is not a prompt corpus")
+    pos = struct.calcsize("<8sQQ")
+    meta = json.loads(buf[pos : pos + meta_len])
+    pos += meta_len
+    offsets = np.frombuffer(buf, dtype="<u8", count=n_prompt + 1, offset=pos)
+    pos += offsets.nbytes
+    token_lens = np.frombuffer(buf, dtype="<u4", count=n_prompt, offset=pos)
+    pos += token_lens.nbytes
+    bounds = (pos + offsets.astype(np.int64)).tolist()
+    prompts = [
+        buf[bounds[i] : bounds[i + 1]].decode("utf-8") for i in range(n_prompt)
+    ]
+    return prompts, token_lens.tolist(), meta
+
 
 # -----------------------------------------------------------------------------
 # ShareGPT Dataset Implementation
@@ -2,6 +2,7 @@ from locust import HttpUser, task, events, constant
 from locust.runners import MasterRunner, WorkerRunner
 from openai import OpenAI
 import os
+import sys
 import json
 import orjson
 import time
@@ -12,11 +13,21 @@ from datetime import datetime
 import pytz
 import logging
 import requests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Repo root, for harness/
+from harness.sse import SSEStreamParser
+from harness.corpus import open_corpus
+from harness.report import MetricsCollector, save_case_result, stream_metrics_to_master, timeseries_path, meets_slo
+from harness.timeseries import TimeSeries
+import gevent
+from locust.util.timespan import parse_timespan
 import numpy as np
 import uuid
 
-worker_data = {"#Req": [], "E2E": [], "TTFT": [], "TPOT": [], "Target":None}
-master_data = {"#Req": [], "E2E": [], "TTFT": [], "TPOT": [], "Target":None}
+worker_metrics = MetricsCollector()
+master_metrics = MetricsCollector()
+master_timeseries = None
+streaming_greenlet = None
+warmup_end = 0  # perf_counter() before which requests are warm-up, set on test_start
 logging.basicConfig(level=logging.INFO) 
 logger = logging.getLogger(__name__) 
 
@@ -32,31 +43,21 @@ class LLMUser(HttpUser):
         self.output_tokens = self.environment.parsed_options.olen
         self.target = self.environment.parsed_options.target
         self.n_completed_request = 0
+        self.n_sent_request = 0
         # self.id = LLMUser.UserIndex
         # LLMUser.UserIndex += 1
         self.id = uuid.uuid4().int & ((1 << 32) - 1) # Only get the first 32 bits as the user id
         np.random.seed(self.id)  # Set the random seed here
 
-        # Load dataset
-        self.input_datafile = self.environment.parsed_options.ifile    
-        ilen = int(self.environment.parsed_options.ifile.split('/')[-1].split('.')[0]) # a/b/c/d/2000.txt
-
-        # Load the tokenizer
         self.n_text=200
-        try:
-            print(self.environment.parsed_options.hf_model, flush=True)
-            self.tokenizer = AutoTokenizer.from_pretrained(self.environment.parsed_options.hf_model)
-            vocab_size = self.tokenizer.vocab_size
-            token_ids_batch = np.random.randint(0, vocab_size, (self.n_text, ilen), dtype=np.int32) # [100, len]
-            self.text = []
-            for token_ids in token_ids_batch:
-                self.text.append(self.tokenizer.decode(token_ids, skip_special_tokens=True))
-            # print(f"[DEBUG] user id = {self.id}, text={self.text}")
-
-        except Exception as e:
-            print(f"Error loading tokenizer: {e}")
-            print(f"Please ensure the model path is correct and the model is a valid Hugging Face model.")
-            exit(1)
+        if self.environment.parsed_options.corpus:
+            # Prompts pre-built by scripts/build_prompt_corpus.py, mapped once per process and shared by its users
+            # Only the indices are per user. The text is decoded from the mapping when the request is sent
+            self.corpus = open_corpus(self.environment.parsed_options.corpus)
+            self.prompt_ids = self.corpus.user_indices(self.id, self.n_text)
+        else:
+            self.corpus = None
+            self.text = self.RandomText()
 
                
         server_common_config = {
@@ -68,7 +69,7 @@ class LLMUser(HttpUser):
         vLLM_config = {
             "model": self.environment.parsed_options.hf_model,
             "messages": [
-                {"role": "user", "content": self.text[self.n_completed_request]}
+                {"role": "user", "content": self.Prompt(0)}
             ],
             "ignore_eos": True,
             "stream_options": {
@@ -80,25 +81,38 @@ class LLMUser(HttpUser):
         if self.server == "vLLM":
             self.data = server_common_config | vLLM_config
 
-        self.E2E = []
-        self.TTFT = []
-        self.TPOT = []
 
         
         # self.id = LLMUser.UserIndex
         # LLMUser.UserIndex += 1
         # print(f"[DEBUG] user id = {self.id}")
 
-    def parse_output_json(self, data):
-        # print(f"[DEBUG] data = {data}, data.choices[0] = {data['choices'][0]}")
-        # print(f"[DEBUG2] delta = {data['choices'][0]['delta']}")
-        # print(f"[DEBUG3] content = {data['choices'][0]['delta']['content']}")
-        # E.g., "choices":[{"index":0,"delta":{"content":" won"},"logprobs":null,"finish_reason":null}]
-        if len(data['choices'])>0:
-            text = data['choices'][0]['delta']['content']
-            return text
-        return ""
-        
+    def Prompt(self, k):
+        if self.corpus is not None:
+            return self.corpus[self.prompt_ids[k % self.n_text]]
+        return self.text[k % self.n_text]
+
+    def RandomText(self):
+        # Load dataset
+        self.input_datafile = self.environment.parsed_options.ifile    
+        ilen = int(self.environment.parsed_options.ifile.split('/')[-1].split('.')[0]) # a/b/c/d/2000.txt
+
+        # Load the tokenizer
+        text = []
+        try:
+            print(self.environment.parsed_options.hf_model, flush=True)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.environment.parsed_options.hf_model)
+            vocab_size = self.tokenizer.vocab_size
+            token_ids_batch = np.random.randint(0, vocab_size, (self.n_text, ilen), dtype=np.int32) # [100, len]
+            for token_ids in token_ids_batch:
+                text.append(self.tokenizer.decode(token_ids, skip_special_tokens=True))
+            # print(f"[DEBUG] user id = {self.id}, text={text}")
+
+        except Exception as e:
+            print(f"Error loading tokenizer: {e}")
+            print(f"Please ensure the model path is correct and the model is a valid Hugging Face model.")
+            exit(1)
+        return text
 
     @task
     def SendRequest(self):
@@ -109,154 +123,112 @@ class LLMUser(HttpUser):
         # self.prompt_idx=(1+self.prompt_idx)%100
         
         headers = {"Content-Type": "application/json"}
-        self.data["messages"][0]["content"] = self.text[(self.n_completed_request)%self.n_text]
+        self.data["messages"][0]["content"] = self.Prompt(self.n_sent_request)
         # print(f"[DEBUG] user id = {self.id}, text={self.data["messages"][0]["content"]}, "
         #       f"n_completed_request={self.n_completed_request}")
-        with self.client.post(
-            self.endpoint,
-            data=json.dumps(self.data),
-            headers=headers,
-            stream=True,
-            catch_response=True,
-        ) as response:
-
-            combined_text = ""
-            done = False
-            
-            try:
-                response.raise_for_status()
-            except Exception as e:
-                raise RuntimeError(f"Error in response: {response.text}") from e
-
-            for chunk in response.iter_lines(delimiter=b"\n\n"):
-                if len(chunk) == 0:
-                    # print("come providers send empty lines between data chunks")
-                    continue 
-                if done:
-                    if chunk != b"data: [DONE]":
-                        print(f"WARNING: Received more chunks after [DONE]: {chunk}")
+        # Warm-up requests (graph capture, cold KV cache) only show up in the time series
+        measured = (time.perf_counter() >= warmup_end and
+                    self.n_sent_request >= self.environment.parsed_options.warmup_requests)
+        self.n_sent_request += 1
+        worker_metrics.count("Started")
+        worker_metrics.in_flight += 1
+        try:
+            with self.client.post(
+                self.endpoint,
+                data=json.dumps(self.data),
+                headers=headers,
+                stream=True,
+                catch_response=True,
+            ) as response:
 
                 try:
-                    now = time.perf_counter()
-
-                    # Stream
-                    assert chunk.startswith(b"data:"), f"Unexpected chunk not starting with 'data': {chunk}"
-                    chunk = chunk[len(b"data:") :]
-                    if chunk.strip() == b"[DONE]":
-                        done = True
-                        continue
-                    data = orjson.loads(chunk)
-                    text = self.parse_output_json(data)
-                    combined_text += text
+                    response.raise_for_status()
+                except Exception as e:
+                    raise RuntimeError(f"Error in response: {response.text}") from e
 
-                    # The last token comes with OpenAI metric
-                    if 'usage' in data and 'server_ttft' in data['usage']:
-                        self.TTFT.append(data['usage']['server_ttft'])
-                        self.E2E.append(data['usage']['server_e2e_latency'])
-                        tpot = (self.E2E[-1] - self.TTFT[-1]) / (data['usage']['completion_tokens']-1)
-                        self.TPOT.append(tpot)
+                parser = SSEStreamParser("chat")
+                try:
+                    for chunk in response.iter_content(chunk_size=None):
+                        parser.feed(chunk)
+
+                    # The last chunk comes with OpenAI metric
+                    usage = parser.usage
+                    if usage is not None and 'server_ttft' in usage:
+                        ttft = usage['server_ttft']
+                        e2e = usage['server_e2e_latency']
+                        worker_metrics.record_series(ttft, e2e, usage['completion_tokens'])
+                        if not measured:
+                            worker_metrics.count("Warmup")
+                            return
+                        tpot = (e2e - ttft) / (usage['completion_tokens']-1)
+                        worker_metrics.record("TTFT", ttft)
+                        worker_metrics.record("E2E", e2e)
+                        worker_metrics.record("TPOT", tpot)
                         self.n_completed_request += 1
-                        # print(f"[DEBUG] usage exists, self.TTFT={self.TTFT}, self.E2E={self.E2E}"
-                        #       f"self.TPOT={self.TPOT}", flush=True)
+                        worker_metrics.count("Completed")
+                        worker_metrics.count("InputTokens", usage['prompt_tokens'])
+                        worker_metrics.count("OutputTokens", usage['completion_tokens'])
+                        if meets_slo(ttft, tpot, self.environment.parsed_options.slo_ttft_ms,
+                                     self.environment.parsed_options.slo_tpot_ms):
+                            worker_metrics.count("Good")
+                        # print(f"[DEBUG] usage exists, TTFT={ttft}, E2E={e2e}", flush=True)
 
                 except Exception as e:
-                    print(f"Failed to parse response: {chunk} with error {repr(e)}")
+                    print(f"Failed to parse response with error {repr(e)}")
                     response.failure(e)
                     return
+                if parser.n_after_done:
+                    print(f"WARNING: Received {parser.n_after_done} more chunks after [DONE]")
 
 
-            # print(f"User #{self.id}, req #{self.n_completed_request}, "
-            #       f"E2E_Latency(s) = {E2E_Latency:.2f}, TTFT(s)={TTFT:.2f}, TPOT(s)={TPOT:.3f} \n"
-            #       f"# output tokens: {len(self.tokenizer.encode(combined_text))}, required output tokens: {self.output_tokens} \n"
-            #       f"Prompt: {self.data['prompt'][:1000]}  \n"
-            #       f"Generated tokens: {combined_text}\n"
-            #       f"------------------\n")
-
+                # print(f"User #{self.id}, req #{self.n_completed_request}, "
+                #       f"E2E_Latency(s) = {E2E_Latency:.2f}, TTFT(s)={TTFT:.2f}, TPOT(s)={TPOT:.3f} \n"
+                #       f"# output tokens: {len(self.tokenizer.encode(combined_text))}, required output tokens: {self.output_tokens} \n"
+                #       f"Prompt: {self.data['prompt'][:1000]}  \n"
+                #       f"Generated tokens: {combined_text}\n"
+                #       f"------------------\n")
+        finally:
+            worker_metrics.in_flight -= 1
 
     def on_stop(self):
-        # Summarize the benchmark
         if self.n_completed_request == 0:
             print(f"Warning: User {self.id}, #completed_request is 0. Increase [-t] or reduce user number.")
-            avg_E2E = avg_TTFT = avg_TPOT = 0
-        else:
-            avg_E2E = sum(self.E2E) / self.n_completed_request
-            avg_TTFT = sum(self.TTFT) / self.n_completed_request
-            avg_TPOT = sum(self.TPOT) / self.n_completed_request
-        
-        worker_data["#Req"].append(self.n_completed_request)
-        worker_data["E2E"].append(avg_E2E)
-        worker_data["TTFT"].append(avg_TTFT)
-        worker_data["TPOT"].append(avg_TPOT)
-        worker_data["Target"] = self.target
+        worker_metrics.add_user(self.n_completed_request, self.target)
 
 
 def report_metrics_to_master(environment, msg):
-    global master_data
-    master_data["#Req"]+=msg.data["#Req"]
-    master_data["E2E"]+=msg.data["E2E"]
-    master_data["TTFT"]+=msg.data["TTFT"]
-    master_data["TPOT"]+=msg.data["TPOT"]
-    master_data["Target"]=msg.data["Target"]
-    # print(f"[DEBUG] msg={msg.data}")
-    # print(f"  master_data={master_data}")
-    
-    n_user = len(master_data["#Req"])
-    if n_user == 0: # When user = 1, processes = 4, not every process handle at least 1 user.
+    # Workers send their metric deltas every --report-interval seconds and once more at test_stop (Final)
+    master_metrics.merge_message(msg.data)
+    master_timeseries.add(msg.data)
+    if not msg.data["Final"]:
+        return
+    warmup = parse_timespan(environment.parsed_options.warmup)
+    master_timeseries.write_csv(timeseries_path(environment.parsed_options.outJson, environment.parsed_options.target),
+                                warmup)
+    if master_metrics.n_user == 0: # When user = 1, processes = 4, not every process handle at least 1 user.
         return
-    n_req = sum(master_data["#Req"])
-    # print("Only show the first 8 users results:")
-    # for i in range(min(n_user,8)):
-    #     print(f"User #{i:3d}, Completed Request = {master_data['#Req'][i]}, "
-    #         f"E2E(s) = {master_data['E2E'][i]:.2f}, "
-    #         f"TTFT(s) = {master_data['TTFT'][i]:.2f}, "
-    #         f"TPOT(s) = {master_data['TPOT'][i]:.3f} ")
-
-    ave_E2E = sum(master_data['E2E']) / n_user
-    ave_TTFT = sum(master_data['TTFT']) / n_user
-    ave_TPOT = sum(master_data['TPOT']) / n_user
-
-    # Save result
-    # Save to a JSON file
-    if os.path.exists(environment.parsed_options.outJson):
-        with open(environment.parsed_options.outJson, 'r') as f:
-            data = json.load(f)  # Load JSON data as a Python dictionary
-    else:
-        data = dict()
-        data["vLLM"] = dict()
-    server = environment.parsed_options.server
-    key = environment.parsed_options.target
-    model_name = os.path.dirname(key)
-    test_case = os.path.basename(key)
-    if server not in data:
-        data[server] = {}
-    if model_name not in data[server]:
-        data[server][model_name] = {}
-    
-    gmt_plus_8 = pytz.timezone('Etc/GMT-8')
-    current_time = datetime.now(gmt_plus_8)
-    formatted_time = current_time.strftime('%Y-%m-%d %H:%M')
-    date = "Taipei Time: " + formatted_time
 
-    data[server][model_name][test_case] = {
-        "Date": date,
-        "#Req": n_req,
-        "E2E": ave_E2E,
-        "TTFT": ave_TTFT,
-        "TPOT": ave_TPOT
+    # Request-weighted mean and percentiles over the merged histograms of all workers
+    # The measured window runs from the end of the warm-up to the latest worker message
+    duration = master_metrics.last_time - (master_timeseries.t0 + warmup)
+    result = master_metrics.summary(duration=duration,
+                                    slo_ttft_ms=environment.parsed_options.slo_ttft_ms,
+                                    slo_tpot_ms=environment.parsed_options.slo_tpot_ms)
+    result["Warmup"] = {
+        "Duration(s)": warmup,
+        "Requests/user": environment.parsed_options.warmup_requests,
+        "#Excluded": master_metrics.counters["Warmup"],
     }
-    # print(f"data = {data}")
-
-    dir = os.path.dirname(environment.parsed_options.outJson)
-    os.makedirs(dir, exist_ok=True)  
-    with open(environment.parsed_options.outJson, 'w') as f:
-        json.dump(data, f, indent=4)  # Save with indentation for readability
-        # print(f"[DEBUG] json data=", data)
-        # print(f"[DEBUG] outJson={outJson}")
+    result["SteadyState"] = master_timeseries.steady_state(warmup)
+    save_case_result(environment.parsed_options.outJson, environment.parsed_options.server,
+                     environment.parsed_options.target, result)
 
 @events.init.add_listener
 def on_locust_init(environment, **_kwargs):
+    global master_timeseries
     if isinstance(environment.runner, MasterRunner):
         environment.runner.register_message('report_metrics_to_master', report_metrics_to_master)
+        master_timeseries = TimeSeries(environment.parsed_options.report_interval or 1)
         if environment.parsed_options.rpd_profile:
             logger.info(f"host = {environment.parsed_options.host} ")
             response = requests.post(environment.parsed_options.host+"/start_profile")
@@ -267,10 +239,24 @@ def on_locust_init(environment, **_kwargs):
     elif isinstance(environment.runner, WorkerRunner):
         pass
 
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    global streaming_greenlet, warmup_end
+    if isinstance(environment.runner, MasterRunner):
+        master_timeseries.start(time.time())
+    elif isinstance(environment.runner, WorkerRunner):
+        warmup_end = time.perf_counter() + parse_timespan(environment.parsed_options.warmup)
+        if environment.parsed_options.report_interval > 0:
+            streaming_greenlet = gevent.spawn(stream_metrics_to_master, environment.runner, worker_metrics,
+                                              environment.parsed_options.report_interval)
+
 @events.test_stop.add_listener
 def on_test_stop(environment, **kwargs):
     if isinstance(environment.runner, MasterRunner):
         #print("[DEBUG] I'm on master node")
+        # Keep the time series of workers that never send their final message
+        master_timeseries.write_csv(timeseries_path(environment.parsed_options.outJson, environment.parsed_options.target),
+                                    parse_timespan(environment.parsed_options.warmup))
         if environment.parsed_options.rpd_profile:
             response = requests.post(environment.parsed_options.host+"/stop_profile")
             if response.status_code == 200:
@@ -279,7 +265,10 @@ def on_test_stop(environment, **kwargs):
                 logger.info(f"Fail to end rpd profiling ")
     elif isinstance(environment.runner, WorkerRunner):
         # print(f"[DEBUG] I'm on worker node.")
-        environment.runner.send_message('report_metrics_to_master', worker_data)
+        if streaming_greenlet is not None:
+            streaming_greenlet.kill()
+        environment.runner.send_message('report_metrics_to_master',
+                                        worker_metrics.pop_message(environment.runner.client_id, final=True))
 
 
 @events.init_command_line_parser.add_listener
@@ -320,6 +309,12 @@ def init_parser(parser):
         type=str,
         help="saving result in the specified key 'target' in outJson file",
     )
+    parser.add_argument(
+        "--corpus",
+        type=str,
+        help=("Prompt corpus built by scripts/build_prompt_corpus.py. Without it, every user loads the tokenizer "
+              "and decodes its own random prompts of -ifile's length."),
+    )
     parser.add_argument(
         "-m",
         "--hf-model",
@@ -328,5 +323,34 @@ def init_parser(parser):
         help=("Path to HF model folder. If not specified we will use env var MODEL_PATH.\n"
               "Required by vLLM server. Also, we use tokenizer to debug the token lengths.")
     )
+    parser.add_argument(
+        "--warmup",
+        type=str,
+        default="0",
+        help=("Drop requests sent during the first part of the test from the metrics, e.g. 30s, 1m. "
+              "They still show up in the time series."),
+    )
+    parser.add_argument(
+        "--warmup-requests",
+        type=int,
+        default=0,
+        help="Drop the first n requests of every user from the metrics",
+    )
+    parser.add_argument(
+        "--slo-ttft-ms",
+        type=float,
+        help="TTFT limit of the goodput SLO. Goodput counts the requests meeting every given limit",
+    )
+    parser.add_argument(
+        "--slo-tpot-ms",
+        type=float,
+        help="TPOT limit of the goodput SLO",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=5,
+        help="Workers push metric deltas to the master every n seconds for the time series. 0: only at the end",
+    )
     parser.add_argument("--rpd-profile", action="store_true", help="Activate profiling for ROCm/vLLM")
 
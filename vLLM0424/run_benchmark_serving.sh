@@ -83,19 +83,28 @@ fi
 # Output 
 # meta-llama/Llama-3.1-8B -> meta-llama_Llama-3.1-8B
 if $Use_V1; then
-    result_folder="Result/0528/V1_HighHit_SingleData/$(basename "$MODEL_NAME")"
+    result_root="Result/0528/V1"
 else
-    result_folder="Result/0528/V0_HighHit_SingleData/$(basename "$MODEL_NAME")"
+    result_root="Result/0528/V0"
 fi
+result_folder="${result_root}/$(basename "$MODEL_NAME")"
 mkdir -p $result_folder
 
+# Prefix-cache hit rates (fraction of prompt tokens) of the random dataset. 1.0 is the old HighHit_SingleData
+# case, every request reuses the whole prompt. HIT_PREFIX_LEN="" lets every request share a hit_rate*ilen prefix.
+PREFIX_HIT_RATE=(0 0.25 0.5 0.75 1.0)
+HIT_PREFIX_LEN=""
+# benchmark_serving.py imports benchmark_dataset.py from its own folder
+cp "$(dirname "$0")/benchmark_dataset-nightly_0527_rc2_main_20250521.py" /app/vllm/benchmarks/benchmark_dataset.py
+
 SERVER_PORT=8000
 Locust_Master_Host=127.0.1.1
 Locust_Master_Port=5002
 
 # Command to launch the server
 server_log=$result_folder/server_log.txt
-vllm serve $MODEL_PATH \
+# VLLM_SERVER_DEV_MODE=1 serves /reset_prefix_cache, to start every case with an empty prefix cache
+VLLM_SERVER_DEV_MODE=1 vllm serve $MODEL_PATH \
     --chat-template /app/vllm/examples/tool_chat_template_llama3.1_json.jinja \
     --dtype ${DTYPE} \
     --tensor-parallel-size $TP \
@@ -147,12 +156,21 @@ python3 /app/vllm/benchmarks/benchmark_serving.py \
     --max-concurrency 4 \
     --percentile-metrics ttft,tpot,itl,e2el
 
+for hit_rate in "${PREFIX_HIT_RATE[@]}"; do
+export RANDOM_PREFIX_HIT_RATE=$hit_rate
+export RANDOM_HIT_PREFIX_LEN=$HIT_PREFIX_LEN
+[ -z "$HIT_PREFIX_LEN" ] && unset RANDOM_HIT_PREFIX_LEN
+result_folder="${result_root}_Hit${hit_rate}/$(basename "$MODEL_NAME")"
+mkdir -p $result_folder
 for concurrency in "${CONCURRENCY[@]}"; do
     for ilen in "${ILEN[@]}"; do
         num_prompts=$((concurrency * 10))
         seed=$((seed + 1))
         # Define the benchmark file path
-        benchmark_file="${result_folder}/i${ilen}_o${olen}_c${concurrency}_p${num_prompts}.log"
+        test_case="i${ilen}_o${olen}_c${concurrency}_p${num_prompts}"
+        benchmark_file="${result_folder}/${test_case}.log"
+        # Prefixes cached by the previous case would inflate the hits of this one
+        curl -s -X POST "${server_url}/reset_prefix_cache" > /dev/null || echo "WARNING: failed to reset the prefix cache"
 
         # Run the benchmark and capture the output in a log file
         python3 /app/vllm/benchmarks/benchmark_serving.py \
@@ -168,9 +186,14 @@ for concurrency in "${CONCURRENCY[@]}"; do
             --seed $seed \
             --max-concurrency "$concurrency" \
             --percentile-metrics ttft,tpot,itl,e2el \
+            --save-result --save-detailed \
+            --result-dir "$result_folder" \
+            --result-filename "${test_case}.serving.json" \
             2>&1 | tee "${benchmark_file}"
     done  
 done
+done
+unset RANDOM_PREFIX_HIT_RATE RANDOM_HIT_PREFIX_LEN
 
 # Kill all vllm server processes
 ps -ef | grep '[p]ython' | awk '{print $2}' | xargs kill -9  # Kill server